@@ -22,17 +22,19 @@ from flask_cors import CORS
 
 from .config import *
 
-from .models import db
+from .models import db, create_stocked_inventory
 
 from .routes import namespaces
+from . import encoder
 
 # initialization
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = URL
 app.config['SQLALCHEMY_COMMIT_ON_TEARDOWN'] = True
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.json_encoder = encoder.FreeGenesJSONEncoder
 # extensions
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 db.init_app(app)
 auth = HTTPBasicAuth()
 authorizations = {
@@ -46,11 +48,22 @@ api = Api(app, version='1.1', title=API_TITLE,
             authorizations=authorizations
             )
 
+@api.representation('application/json')
+def output_json(data, code, headers=None): # Anything a namespace returns without jsonify goes through the same encoder
+    response = app.response_class(encoder.dumps(data) + b'\n', status=code, mimetype='application/json')
+    response.headers.extend(headers or {})
+    return response
+
 migrate = Migrate(app, db)
 
 for ns in namespaces:
     api.add_namespace(ns)
 
+@app.cli.command('create-inventory')
+def create_inventory():
+    '''Create the stocked_inventory snapshot the transfer planner reads from'''
+    create_stocked_inventory(db.get_engine())
+
 
 if __name__ == '__main__' and DEV == True:
     app.run(debug=True)
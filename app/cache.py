@@ -0,0 +1,149 @@
+import time
+import pickle
+import threading
+from functools import wraps
+from collections import OrderedDict
+
+import sqlalchemy
+from sqlalchemy.orm import Session
+from flask import request, make_response, Response
+
+from .config import REDIS_URL, CACHE_SIZE, CACHE_TTL
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+class LRUCache():
+    def __init__(self,maxsize=128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self,key,default=None):
+        with self.lock:
+            if key not in self.entries:
+                return default
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def set(self,key,value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return value
+
+    def pop(self,key):
+        with self.lock:
+            return self.entries.pop(key,None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class ResponseCache(): # In-process LRU, optionally backed by a shared redis tier
+    prefix = 'freegenes:'
+
+    def __init__(self,maxsize=512,ttl=60,redis_url=None):
+        self.local = LRUCache(maxsize=maxsize)
+        self.ttl = ttl
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.shared = redis.Redis.from_url(redis_url) if redis_url != None and redis != None else None
+
+    # Every table has a generation that writes bump. Keys embed the generations of the
+    # tables a response reads, so invalidating never has to find the keys themselves.
+    # Without redis the generations are per worker: a write through one worker is
+    # invisible to the others, so nothing that other workers serve may rely on them.
+    def table_generations(self,tables):
+        if self.shared != None:
+            return tuple(int(value or 0) for value in self.shared.mget([self.prefix+'generation:'+table for table in tables]))
+        with self.lock:
+            return tuple(self.generations.get(table,0) for table in tables)
+
+    def invalidate(self,tables):
+        tables = sorted(tables)
+        if tables == []:
+            return
+        with self.lock:
+            for table in tables:
+                self.generations[table] = self.generations.get(table,0) + 1
+        if self.shared != None:
+            pipeline = self.shared.pipeline()
+            for table in tables:
+                pipeline.incr(self.prefix+'generation:'+table)
+            pipeline.execute()
+
+    def key(self,tables):
+        args = '&'.join('{}={}'.format(k,v) for k,v in sorted(request.args.items(multi=True)))
+        return '{}response:{}?{}|{}'.format(self.prefix,request.path,args,self.table_generations(tables))
+
+    def get(self,key):
+        entry = self.local.get(key)
+        if entry != None and entry[0] > time.time():
+            return entry[1]
+        if self.shared != None:
+            value = self.shared.get(key)
+            if value != None:
+                value = pickle.loads(value)
+                self.local.set(key,(time.time()+self.ttl,value))
+                return value
+        return None
+
+    def set(self,key,value,ttl=None):
+        ttl = self.ttl if ttl == None else ttl
+        self.local.set(key,(time.time()+ttl,value))
+        if self.shared != None:
+            self.shared.setex(key,ttl,pickle.dumps(value))
+        return value
+
+response_cache = ResponseCache(maxsize=CACHE_SIZE,ttl=CACHE_TTL,redis_url=REDIS_URL)
+
+def cached(*tables): # Cache a GET by path and query string until one of tables is written
+    def cached_decorator(f):
+        if response_cache.shared == None: # Only with redis are writes through any worker seen by all of them
+            return f
+        @wraps(f)
+        def decorated(*args,**kwargs):
+            key = response_cache.key(tables)
+            hit = response_cache.get(key)
+            if hit != None:
+                return Response(hit[1],status=200,mimetype=hit[0])
+            response = make_response(f(*args,**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                response_cache.set(key,(response.mimetype,response.get_data()))
+            return response
+        return decorated
+    return cached_decorator
+
+def touch_tables(session,tables): # For writes the flush hook cannot see, like query.delete()
+    session.info.setdefault('touched_tables',set()).update(tables)
+
+@sqlalchemy.event.listens_for(Session,'after_flush')
+def collect_touched_tables(session,flush_context):
+    touched = session.info.setdefault('touched_tables',set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        touched.add(sqlalchemy.inspect(obj).mapper.local_table.name)
+
+commit_callbacks = [response_cache.invalidate]
+def on_commit(callback): # callback(tables) runs after every commit that wrote to any table
+    commit_callbacks.append(callback)
+    return callback
+
+@sqlalchemy.event.listens_for(Session,'after_commit')
+def invalidate_touched_tables(session):
+    touched = session.info.pop('touched_tables',None)
+    if touched:
+        for callback in commit_callbacks:
+            callback(touched)
+
+@sqlalchemy.event.listens_for(Session,'after_rollback')
+def discard_touched_tables(session):
+    session.info.pop('touched_tables',None)
@@ -17,3 +17,18 @@ API_TITLE = os.environ['API_TITLE']
 API_DESCRIPTION = os.environ['API_DESCRIPTION']
 SHIPPO_KEY = os.environ['SHIPPO_KEY']
 
+
+# Optional shared tier for caches and jobs, e.g. redis://localhost:6379/0. Response caching is off without it
+REDIS_URL = os.environ.get('REDIS_URL')
+CACHE_SIZE = int(os.environ.get('CACHE_SIZE', 512))
+CACHE_TTL = int(os.environ.get('CACHE_TTL', 60)) # seconds
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 0)) # threads for an in-process queue without redis; only safe with a single web worker
+JOB_TIMEOUT = int(os.environ.get('JOB_TIMEOUT', 900)) # seconds
+JOB_RESULT_TTL = int(os.environ.get('JOB_RESULT_TTL', 3600)) # seconds
+PLAN_CACHE_TTL = int(os.environ.get('PLAN_CACHE_TTL', 86400)) # seconds a solved build is kept for re-planning, only with REDIS_URL
+UPLOAD_PART_SIZE = max(int(os.environ.get('UPLOAD_PART_SIZE', 8388608)), 5242880) # bytes, S3 multipart parts must be at least 5MB
+UPLOAD_CONCURRENCY = int(os.environ.get('UPLOAD_CONCURRENCY', 4)) # parts uploaded at once by a streaming upload
+DOWNLOAD_CHUNK_SIZE = int(os.environ.get('DOWNLOAD_CHUNK_SIZE', 1000000)) # bytes per ranged get when streaming a download
+DOWNLOAD_CONCURRENCY = int(os.environ.get('DOWNLOAD_CONCURRENCY', 4)) # ranged gets in flight per download
+PRESIGN_EXPIRES = int(os.environ.get('PRESIGN_EXPIRES', 300)) # seconds a presigned upload or download url stays valid
+DOWNLOAD_REDIRECT = os.environ.get('DOWNLOAD_REDIRECT', 'false').lower() == 'true' # send downloads to presigned urls by default
@@ -0,0 +1,62 @@
+import os
+import json
+import uuid
+import decimal
+import datetime
+from flask import Response
+from flask.json import JSONEncoder
+from werkzeug.http import http_date
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Same output as Flask's encoder (http dates, sorted keys), without going through its fallback chain per value
+
+def default(o):
+    if isinstance(o,uuid.UUID):
+        return str(o)
+    if isinstance(o,datetime.datetime):
+        return http_date(o.utctimetuple())
+    if isinstance(o,datetime.date):
+        return http_date(o.timetuple())
+    if isinstance(o,decimal.Decimal):
+        return float(o)
+    if numpy != None and isinstance(o,numpy.generic): # Scalars out of pandas frames, like inventory volumes
+        return o.item()
+    if hasattr(o,'__html__'):
+        return str(o.__html__())
+    raise TypeError('Object of type {} is not JSON serializable'.format(type(o).__name__))
+
+class FreeGenesJSONEncoder(JSONEncoder):
+    def default(self,o):
+        return default(o)
+
+def stdlib_dumps(obj):
+    return json.dumps(obj,default=default,sort_keys=True,separators=(',',':')).encode('utf-8')
+
+def orjson_dumps(obj): # orjson writes UUIDs itself; datetimes are passed through so they keep the http date format
+    return orjson.dumps(obj,default=default,option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME)
+
+backends = {'json': stdlib_dumps}
+if orjson != None:
+    backends['orjson'] = orjson_dumps
+
+def set_backend(name):
+    global dumps
+    dumps = backends[name]
+    return dumps
+
+dumps = backends.get(os.environ.get('JSON_BACKEND'), orjson_dumps if orjson != None else stdlib_dumps)
+
+def jsonify(*args,**kwargs):
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    data = args[0] if len(args) == 1 else (list(args) or kwargs)
+    return Response(dumps(data) + b'\n',mimetype='application/json')
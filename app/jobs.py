@@ -0,0 +1,72 @@
+import uuid
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from .config import REDIS_URL, JOB_WORKERS, JOB_TIMEOUT, JOB_RESULT_TTL
+from .cache import LRUCache
+
+try:
+    import redis
+    from rq import Queue
+    from rq.job import Job
+    from rq.exceptions import NoSuchJobError
+except ImportError:
+    redis = None
+
+# Long running work (build planning) goes to an rq queue when REDIS_URL is set, run
+# by `rq worker builds --url $REDIS_URL`. Without redis, JOB_WORKERS > 0 runs jobs on a
+# thread pool in the web process. Status is then only visible to the worker that accepted
+# the job, so that is for single worker setups; otherwise jobs is None and async is refused.
+
+class RQJobs():
+    def __init__(self,redis_url,name='builds'):
+        self.connection = redis.Redis.from_url(redis_url)
+        self.queue = Queue(name,connection=self.connection)
+
+    def enqueue(self,f,*args):
+        return self.queue.enqueue(f,*args,job_timeout=JOB_TIMEOUT,result_ttl=JOB_RESULT_TTL,failure_ttl=JOB_RESULT_TTL).id
+
+    def status(self,job_id): # None if the job does not exist (or has expired)
+        try:
+            job = Job.fetch(job_id,connection=self.connection)
+        except NoSuchJobError:
+            return None
+        status = job.get_status()
+        if status == 'finished':
+            return {'status':'finished','result':job.result}
+        if status == 'failed':
+            return {'status':'failed','message':(job.exc_info or 'Job failed').strip().split('\n')[-1]}
+        return {'status':'started' if status == 'started' else 'queued'}
+
+
+class ThreadJobs():
+    def __init__(self,max_workers=2,maxsize=256):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.futures = LRUCache(maxsize=maxsize)
+
+    def enqueue(self,f,*args):
+        job_id = str(uuid.uuid4())
+        self.futures.set(job_id,self.executor.submit(f,*args))
+        return job_id
+
+    def status(self,job_id):
+        future = self.futures.get(job_id)
+        if future == None:
+            return None
+        if not future.done():
+            return {'status':'started' if future.running() else 'queued'}
+        e = future.exception()
+        if e != None:
+            return {'status':'failed','message':traceback.format_exception_only(type(e),e)[-1].strip()}
+        return {'status':'finished','result':future.result()}
+
+
+if REDIS_URL != None and redis != None:
+    jobs = RQJobs(REDIS_URL)
+elif JOB_WORKERS > 0:
+    jobs = ThreadJobs(max_workers=JOB_WORKERS)
+else:
+    jobs = None
+
+def jobs_unavailable():
+    return {'message': 'Async builds need REDIS_URL and an rq worker (or JOB_WORKERS with a single web worker)'}
@@ -8,6 +8,13 @@ import uuid
 
 from .config import SPACES
 from .config import BUCKET
+from .config import UPLOAD_PART_SIZE, UPLOAD_CONCURRENCY, DOWNLOAD_CHUNK_SIZE, DOWNLOAD_CONCURRENCY, PRESIGN_EXPIRES
+from concurrent.futures import ThreadPoolExecutor
+import mimetypes
+import itertools
+from collections import deque
+import datetime
+from werkzeug.http import http_date
 
 from itsdangerous import (TimedJSONWebSignatureSerializer
                           as Serializer, BadSignature, SignatureExpired)
@@ -21,9 +28,14 @@ auth = HTTPBasicAuth()
 ##################
 
 from jsonschema import validate
+from jsonschema.validators import validator_for
+import hashlib
 import json
 import string
 
+from .cache import LRUCache, on_commit, response_cache
+import threading
+
 # Shared
 uuid_regex = '^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$'
 null = {'type': 'null'}
@@ -54,6 +66,11 @@ def schema_generator(properties,required,additionalProperties=False):
             "required": required,
             "additionalProperties": additionalProperties}
 
+def compile_validator(schema): # Check the schema once and keep the validator around, instead of validate() redoing both per call
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
 
 #################
 ### FreeGenes ###
@@ -94,35 +111,150 @@ files_organisms = db.Table('files_organisms',
     db.Column('organisms_uuid', UUID(as_uuid=True), db.ForeignKey('organisms.uuid'),primary_key=True,nullable=True),
 )
 
+object_metadata_cache = LRUCache(maxsize=1024) # Objects are never rewritten under the same key, so entries only go on delete
+
+def object_metadata(s3, key):
+    metadata = object_metadata_cache.get(key)
+    if metadata == None:
+        head = s3.head_object(Bucket=BUCKET, Key=key)
+        metadata = object_metadata_cache.set(key, {'size': head['ContentLength'], 'content_type': head.get('ContentType'), 'etag': head.get('ETag'), 'last_modified': head.get('LastModified')})
+    return metadata
+
 def get_total_bytes(s3, key):
-    result = s3.list_objects(Bucket=BUCKET)
-    for item in result['Contents']:
-        if item['Key'] == key:
-            return item['Size']
+    return object_metadata(s3, key)['size']
 
 def get_object(s3, total_bytes,key):
-    if total_bytes > 1000000:
-        return get_object_range(s3, total_bytes, key)
+    if total_bytes > DOWNLOAD_CHUNK_SIZE:
+        return get_object_range(s3, key, 0, total_bytes)
     return s3.get_object(Bucket=BUCKET, Key=key)['Body'].read()
 
-def get_object_range(s3, total_bytes, key):
-    offset = 0
-    while total_bytes > 0:
-        end = offset + 999999 if total_bytes > 1000000 else ""
-        total_bytes -= 1000000
-        byte_range = 'bytes={offset}-{end}'.format(offset=offset, end=end)
-        offset = end + 1 if not isinstance(end, str) else None
-        yield s3.get_object(Bucket=BUCKET, Key=key, Range=byte_range)['Body'].read()
+def get_object_range(s3, key, start, stop, chunk_size=DOWNLOAD_CHUNK_SIZE, concurrency=DOWNLOAD_CONCURRENCY):
+    """Bytes [start, stop) as a series of ranged gets. The next chunks are fetched on a
+    thread pool while the current one streams out, with at most `concurrency` chunks
+    held at once. Closing the generator (client gone) cancels what has not started."""
+    def fetch(offset):
+        byte_range = 'bytes={}-{}'.format(offset, min(offset + chunk_size, stop) - 1)
+        return s3.get_object(Bucket=BUCKET, Key=key, Range=byte_range)['Body'].read()
+    offsets = iter(range(start, stop, chunk_size))
+    executor = ThreadPoolExecutor(max_workers=max(concurrency, 1))
+    pending = deque(executor.submit(fetch, offset) for offset in itertools.islice(offsets, max(concurrency, 1)))
+    try:
+        while pending:
+            yield pending.popleft().result()
+            for offset in itertools.islice(offsets, 1):
+                pending.append(executor.submit(fetch, offset))
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+for extension in ['.fastq','.fq','.pileup','.gb','.gbk','.fasta','.fa']: # Sequencing files read as text, like every download used to
+    mimetypes.add_type('text/plain', extension)
+
+compressed_types = {'gzip': 'application/gzip', 'bzip2': 'application/x-bzip2', 'xz': 'application/x-xz', 'compress': 'application/x-compress', 'br': 'application/x-brotli'}
+
+def content_type(name): # reads.fastq.gz is a gzip file, not text
+    mimetype, encoding = mimetypes.guess_type(name)
+    if encoding != None:
+        return compressed_types.get(encoding,'application/octet-stream')
+    return mimetype or 'application/octet-stream'
+
+def read_part(stream,part_size): # Short only at the end of the stream
+    part = bytearray()
+    while len(part) < part_size:
+        chunk = stream.read(min(part_size - len(part),1048576))
+        if not chunk:
+            break
+        part += chunk
+    return bytes(part)
+
+def multipart_upload(s3,stream,key,part_size=UPLOAD_PART_SIZE,concurrency=UPLOAD_CONCURRENCY,bucket=BUCKET,content_type='application/octet-stream'):
+    """Pipe a stream of unknown length into an S3 multipart upload, with at most
+    `concurrency` parts in flight, so memory stays around (concurrency + 1) * part_size.
+    Parts other than the last must be at least 5MB. Returns the number of bytes uploaded."""
+    upload_id = s3.create_multipart_upload(Bucket=bucket,Key=key,ContentType=content_type)['UploadId']
+    slots = threading.BoundedSemaphore(concurrency)
+    def upload_part(number,body):
+        try:
+            return {'PartNumber': number, 'ETag': s3.upload_part(Bucket=bucket,Key=key,UploadId=upload_id,PartNumber=number,Body=body)['ETag']}
+        finally:
+            slots.release()
+    total_bytes = 0
+    try:
+        futures = []
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for number in range(1,10001): # S3 allows 10000 parts
+                body = read_part(stream,part_size)
+                if body == b'' and number > 1:
+                    break
+                slots.acquire()
+                for future in futures:
+                    if future.done() and future.exception() != None:
+                        slots.release()
+                        raise future.exception()
+                futures.append(executor.submit(upload_part,number,body))
+                total_bytes += len(body)
+                if len(body) < part_size:
+                    break
+            else:
+                raise ValueError('Upload is larger than 10000 parts of {} bytes'.format(part_size))
+            parts = [future.result() for future in futures]
+        s3.complete_multipart_upload(Bucket=bucket,Key=key,UploadId=upload_id,MultipartUpload={'Parts': parts})
+    except BaseException:
+        s3.abort_multipart_upload(Bucket=bucket,Key=key,UploadId=upload_id)
+        raise
+    return total_bytes
+
+# Presigned mode: clients move the bytes to and from spaces themselves, the API only keeps the Files rows
+presign_schema = {
+    'name': generic_string,
+    'size': {'type': 'integer', 'minimum': 0} # bytes; above UPLOAD_PART_SIZE the upload is split into presigned parts
+}
+presign_required = ['name']
+finalize_schema = {
+    'name': generic_string,
+    'file_name': uuid_schema,
+    'upload_id': generic_string,
+    'parts': {'type': 'array', 'items': {'type': 'object', 'properties': {'part_number': {'type': 'integer', 'minimum': 1, 'maximum': 10000}, 'etag': generic_string}, 'required': ['part_number','etag'], 'additionalProperties': False}}
+}
+finalize_required = ['name','file_name']
+
+def presign_upload(s3, name, size=None, part_size=UPLOAD_PART_SIZE, expires=PRESIGN_EXPIRES):
+    file_name = str(uuid.uuid4())
+    if size == None or size <= part_size:
+        url = s3.generate_presigned_url('put_object', Params={'Bucket': BUCKET, 'Key': file_name, 'ContentType': content_type(name)}, ExpiresIn=expires)
+        return {'file_name': file_name, 'method': 'PUT', 'url': url, 'headers': {'Content-Type': content_type(name)}}
+    part_count = -(-size // part_size)
+    if part_count > 10000:
+        raise ValueError('Upload is larger than 10000 parts of {} bytes'.format(part_size))
+    upload_id = s3.create_multipart_upload(Bucket=BUCKET, Key=file_name, ContentType=content_type(name))['UploadId']
+    parts = [{'part_number': number, 'url': s3.generate_presigned_url('upload_part', Params={'Bucket': BUCKET, 'Key': file_name, 'UploadId': upload_id, 'PartNumber': number}, ExpiresIn=expires)} for number in range(1, part_count + 1)]
+    return {'file_name': file_name, 'method': 'PUT', 'upload_id': upload_id, 'part_size': part_size, 'parts': parts}
+
+def finalize_upload(s3, file_name, upload_id=None, parts=None): # Returns the object size; raises if the object never arrived
+    if upload_id != None:
+        try:
+            s3.complete_multipart_upload(Bucket=BUCKET, Key=file_name, UploadId=upload_id,
+                    MultipartUpload={'Parts': [{'PartNumber': part['part_number'], 'ETag': part['etag']} for part in sorted(parts or [], key=lambda part: part['part_number'])]})
+        except Exception:
+            s3.abort_multipart_upload(Bucket=BUCKET, Key=file_name, UploadId=upload_id)
+            raise
+    return get_total_bytes(s3, file_name)
 
 class Files(db.Model):
-    def __init__(self,name,file):
+    def __init__(self,name,file=None,file_name=None,size=None): # Pass file_name instead of file for objects already in spaces
+        if file_name != None:
+            self.name = name
+            self.file_name = file_name
+            self.size = size if size != None else get_total_bytes(SPACES,file_name)
+            return
         file_name = str(uuid.uuid4())
         def upload_file_to_spaces(file,file_name=file_name,bucket_name=BUCKET,spaces=SPACES):
             """
             Docs: http://boto3.readthedocs.io/en/latest/guide/s3.html
             http://zabana.me/notes/upload-files-amazon-s3-flask.html"""
             try:
-                spaces.upload_fileobj(file,bucket_name,file_name)
+                spaces.upload_fileobj(file,bucket_name,file_name,ExtraArgs={'ContentType': content_type(name)})
             except Exception as e:
                 print("Failed: {}".format(e))
                 return False
@@ -130,23 +262,52 @@ class Files(db.Model):
         if upload_file_to_spaces(file,file_name=file_name) == True:
             self.name = name
             self.file_name = file_name
+            self.size = get_total_bytes(SPACES,file_name)
     __tablename__ = 'files'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
     time_created = db.Column(db.DateTime(timezone=True), server_default=func.now())
 
     name = db.Column(db.String, nullable=False) # Name to be displayed to user
     file_name = db.Column(db.String, nullable=False) # Link to spaces
+    size = db.Column(db.BigInteger, nullable=True) # bytes, null for files uploaded before sizes were stored
 
     def toJSON(self,full=None):
-        return {'uuid':self.uuid,'name':self.name,'file_name':self.file_name}
+        return {'uuid':self.uuid,'name':self.name,'file_name':self.file_name,'size':self.size}
+    def if_range_matches(self): # Objects never change under a key, so the key is a strong ETag
+        if_range = request.if_range
+        if if_range.etag != None:
+            return if_range.etag == self.file_name
+        if if_range.date != None and self.time_created != None:
+            date = if_range.date if if_range.date.tzinfo != None else if_range.date.replace(tzinfo=datetime.timezone.utc)
+            return int(self.time_created.timestamp()) <= date.timestamp()
+        return True
+
+    def presigned_url(self,expires=PRESIGN_EXPIRES):
+        return SPACES.generate_presigned_url('get_object', Params={'Bucket': BUCKET, 'Key': self.file_name,
+            'ResponseContentType': content_type(self.name), 'ResponseContentDisposition': 'attachment;filename={}'.format(self.name)}, ExpiresIn=expires)
+
     def download(self):
         s3 = SPACES
         key = self.file_name
-        total_bytes = get_total_bytes(s3,key)
+        total_bytes = self.size if self.size != None else get_total_bytes(s3,key)
+        headers = {"Content-Disposition": "attachment;filename={}".format(self.name), 'Accept-Ranges': 'bytes', 'ETag': '"{}"'.format(key)}
+        if self.time_created != None:
+            headers['Last-Modified'] = http_date(self.time_created)
+        # One range is served as a 206; several ranges, or a stale If-Range, get the whole file
+        if request.range != None and len(request.range.ranges) == 1 and self.if_range_matches():
+            byte_range = request.range.range_for_length(total_bytes)
+            if byte_range == None:
+                headers['Content-Range'] = 'bytes */{}'.format(total_bytes)
+                return Response(status=416, headers=headers)
+            start, stop = byte_range
+            headers['Content-Range'] = 'bytes {}-{}/{}'.format(start, stop - 1, total_bytes)
+            headers['Content-Length'] = str(stop - start)
+            return Response(get_object_range(s3, key, start, stop), status=206, mimetype=content_type(self.name), headers=headers)
+        headers['Content-Length'] = str(total_bytes)
         return Response(
             get_object(s3, total_bytes, key),
-            mimetype='text/plain',
-            headers={"Content-Disposition": "attachment;filename={}".format(self.name)})
+            mimetype=content_type(self.name),
+            headers=headers)
 
 
 
@@ -161,6 +322,7 @@ collection_required = ['name','readme']
 
 class Collection(db.Model):
     __tablename__ = 'collections'
+    full_relationships = ['parts']
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
     time_created = db.Column(db.DateTime(timezone=True), server_default=func.now())
     time_updated = db.Column(db.DateTime(timezone=True), onupdate=func.now())
@@ -195,6 +357,7 @@ author_schema = {
 author_required = ['name','email']
 class Author(db.Model):
     __tablename__ = 'authors'
+    full_relationships = ['parts']
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
     name = db.Column(db.String)
     email = db.Column(db.String)
@@ -256,6 +419,8 @@ part_schema = {
 part_required = ['name','description','full_sequence','author_uuid','collection_id']
 class Part(db.Model):
     __tablename__ = 'parts'
+    full_relationships = ['samples']
+    heavy_columns = ['original_sequence','optimized_sequence','synthesized_sequence','full_sequence','genbank'] # Deferred in list views
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
     time_created = db.Column(db.DateTime(timezone=True), server_default=func.now())
     time_updated = db.Column(db.DateTime(timezone=True), onupdate=func.now())
@@ -324,6 +489,7 @@ container_required = ['name','container_type']
 class Container(db.Model):
     validator = schema_generator(container_schema,container_required)
     put_validator = schema_generator(container_schema,[])
+    full_relationships = ['plates']
 
     __tablename__ = 'containers'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
@@ -465,6 +631,7 @@ plate_required = ['status','breadcrumb','plate_name','plate_form','plate_type']
 class Plate(db.Model):
     validator = schema_generator(plate_schema,plate_required)
     put_validator = schema_generator(plate_schema,[])
+    full_relationships = ['wells']
 
     __tablename__ = 'plates'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
@@ -514,6 +681,7 @@ samples_wells = db.Table('samples_wells',
 class Sample(db.Model):
     validator = schema_generator(sample_schema,sample_required)
     put_validator = schema_generator(sample_schema,[])
+    full_relationships = ['wells']
 
     __tablename__ = 'samples'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
@@ -570,6 +738,7 @@ well_required = ['address','volume','media','plate_uuid','samples']
 class Well(db.Model): # Constrain Wells to being unique to each plate
     validator = schema_generator(well_schema,well_required)
     put_validator = schema_generator(well_schema,[])
+    full_relationships = ['samples']
     #many_to_many = [{'samples': Sample}]
 
     __tablename__ = 'wells'
@@ -604,6 +773,7 @@ protocol_required = ['protocol','schema_uuid']
 class Protocol(db.Model):
     validator = schema_generator(protocol_schema,protocol_required)
     put_validator = schema_generator(protocol_schema,[])
+    full_relationships = ['plates']
 
     __tablename__ = 'protocols'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
@@ -715,6 +885,7 @@ plateset_required = ['name','plates']
 class PlateSet(db.Model):
     validator = schema_generator(plateset_schema,plateset_required)
     put_validator = schema_generator(plateset_schema,[])
+    full_relationships = ['plates']
     #many_to_many = [{'plates': Plate}]
 
     __tablename__ = 'platesets'
@@ -743,6 +914,7 @@ distribution_required = ['name','platesets']
 class Distribution(db.Model):
     validator = schema_generator(distribution_schema,distribution_required)
     put_validator = schema_generator(distribution_schema,[])
+    full_relationships = ['platesets']
     #many_to_many = [{'platesets': PlateSet}]
 
     __tablename__ = 'distributions'
@@ -781,6 +953,7 @@ order_required = ['name','address','distributions']
 class Order(db.Model):
     validator = schema_generator(order_schema,order_required)
     put_validator = schema_generator(order_schema,[])
+    full_relationships = ['distributions']
     #many_to_many = [{'distributions': Distribution}]
 
     __tablename__ = 'orders'
@@ -823,6 +996,7 @@ shipment_required = ['name','parcel_uuid','order_uuid','address_from','address_t
 class Shipment(db.Model):
     validator = schema_generator(shipment_schema,shipment_required)
     put_validator = schema_generator(shipment_schema,[])
+    full_relationships = ['plates']
 
     __tablename__ = 'shipments'
     uuid = db.Column(UUID(as_uuid=True), unique=True, nullable=False,default=sqlalchemy.text("uuid_generate_v4()"), primary_key=True)
@@ -1023,4 +1197,125 @@ class Schema(db.Model):
             pass
         return dictionary
 
-
+def schema_hash(schema):
+    return hashlib.sha256(json.dumps(schema).encode('utf-8')).hexdigest()
+
+# User defined schemas, keyed by schema_hash. A changed schema gets a new hash, so a stale entry is never hit
+schema_validators = LRUCache(maxsize=128)
+
+def schema_validator(schema_uuid):
+    row = db.session.query(Schema.schema_hash).filter_by(uuid=schema_uuid).first()
+    if row == None:
+        raise ValueError('Schema {} not found'.format(schema_uuid))
+    key = row.schema_hash
+    validator = schema_validators.get(key) if key != None else None
+    if validator == None:
+        schema = db.session.query(Schema.schema).filter_by(uuid=schema_uuid).first().schema
+        key = key if key != None else schema_hash(schema)
+        validator = schema_validators.set(key,compile_validator(schema))
+    return validator
+
+for model in db.Model.__subclasses__():
+    if hasattr(model,'validator'):
+        model.compiled_validator = compile_validator(model.validator)
+    if hasattr(model,'time_created'): # Keyset pagination walks lists in (time_created NULLS FIRST, uuid) order
+        db.Index('ix_{}_keyset'.format(model.__tablename__),model.__table__.c.time_created.asc().nullsfirst(),model.__table__.c.uuid)
+
+
+
+
+### Inventory snapshot
+# Stocked wells per sample with everything the transfer planner filters on, so
+# Build reads one indexed view instead of joining five tables and counting wells
+stocked_inventory_sql = """CREATE MATERIALIZED VIEW IF NOT EXISTS stocked_inventory AS
+SELECT s.part_uuid, s.uuid AS sample_uuid, w.uuid AS well_uuid, pl.uuid AS plate_uuid, w.address, w.volume,
+    s.status AS sample_status, s.evidence AS sample_evidence, pl.plate_type, pl.thaw_count, t.well_count, pl.container_uuid
+FROM samples AS s
+JOIN samples_wells AS sw ON sw.samples_uuid=s.uuid
+JOIN wells AS w ON w.uuid=sw.wells_uuid
+JOIN plates AS pl ON pl.uuid=w.plate_uuid
+JOIN (SELECT plate_uuid, COUNT(*) AS well_count FROM wells GROUP BY plate_uuid) AS t ON t.plate_uuid=pl.uuid
+WHERE pl.status = 'Stocked';
+CREATE UNIQUE INDEX IF NOT EXISTS stocked_inventory_sample_well ON stocked_inventory (sample_uuid, well_uuid);
+CREATE INDEX IF NOT EXISTS stocked_inventory_part ON stocked_inventory (part_uuid);"""
+inventory_tables = {'plates','wells','samples','samples_wells'}
+
+def create_stocked_inventory(engine):
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(stocked_inventory_sql))
+
+def refresh_stocked_inventory(engine):
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text('REFRESH MATERIALIZED VIEW CONCURRENTLY stocked_inventory'))
+
+class InventoryRefresher(): # Refreshes off the request thread; writes that land mid-refresh get exactly one more refresh
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.running = False
+        self.pending = False
+        self.generations = set()
+
+    def request(self,engine,generations=()):
+        with self.lock:
+            self.generations.update(generations)
+            if self.running:
+                self.pending = True
+                return
+            self.running = True
+        threading.Thread(target=self.run,args=(engine,),daemon=True).start()
+
+    def run(self,engine):
+        while True:
+            with self.lock:
+                generations, self.generations = self.generations, set()
+            try:
+                refresh_stocked_inventory(engine)
+                response_cache.invalidate(generations | {'snapshot'}) # Plans solved before the snapshot caught up are stale too
+            except Exception as e:
+                print("Inventory refresh failed: {}".format(e))
+            with self.lock:
+                if not self.pending:
+                    self.running = False
+                    return
+                self.pending = False
+
+inventory_refresher = InventoryRefresher()
+
+@on_commit
+def refresh_inventory_on_commit(tables):
+    if tables & inventory_tables:
+        inventory_refresher.request(db.get_engine(),[table for table in tables if table == 'inventory' or table.startswith('plate:')])
+
+# Cached build plans depend on the generations of their candidate plates, plus an
+# 'inventory' generation for changes that can bring new plates into play. These
+# ride along with the table names the response cache already bumps on commit.
+def plate_generation(plate_uuid):
+    return 'plate:{}'.format(plate_uuid)
+
+@sqlalchemy.event.listens_for(sqlalchemy.orm.Session,'after_flush')
+def collect_touched_plates(session,flush_context):
+    touched = session.info.setdefault('touched_tables',set())
+    for obj in session.new:
+        if isinstance(obj,(Plate,Well,Sample)):
+            touched.add('inventory')
+    for obj in session.deleted:
+        if isinstance(obj,Plate):
+            touched.add(plate_generation(obj.uuid))
+        elif isinstance(obj,Well):
+            touched.add(plate_generation(obj.plate_uuid))
+        elif isinstance(obj,Sample):
+            touched.add('inventory')
+    for obj in session.dirty:
+        if not isinstance(obj,(Plate,Well,Sample)):
+            continue
+        changed = {attr.key for attr in sqlalchemy.inspect(obj).attrs if attr.history.has_changes()} - {'time_updated'}
+        if changed == set():
+            continue
+        if isinstance(obj,Plate):
+            touched.add(plate_generation(obj.uuid))
+            if 'plate_type' in changed or ('status' in changed and obj.status == 'Stocked'):
+                touched.add('inventory')
+        elif isinstance(obj,Well) and changed == {'volume'}:
+            touched.add(plate_generation(obj.plate_uuid))
+        else:
+            touched.add('inventory')
@@ -1,8 +1,18 @@
 import pandas as pd
+import numpy as np
+import sqlalchemy
 import itertools
 from constraint import *
 import os
-from .models import uuid_schema, generic_num,schema_generator
+import time
+import math
+import heapq
+import bisect
+import json
+import hashlib
+from .models import uuid_schema, generic_num,schema_generator,compile_validator,plate_generation
+from .cache import response_cache
+from .config import PLAN_CACHE_TTL
 
 con = os.environ['URL']
 
@@ -20,34 +30,67 @@ class Part():
     def export(self):
         return {'uuid':self.uuid,'address':self.address,'plate_uuid':self.plate_uuid}
             
+def popcount(mask):
+    return bin(mask).count('1')
+
+def remaining_volume(part): # Dry wells (null volume, NaN once through pandas) hold nothing
+    volume = part.volume if part.volume != None and not math.isnan(part.volume) else 0
+    return volume - part.volume_used
+
 class Plate():
-    def __init__(self,uuid,parts_list,thaw_weight,container_uuid):
+    def __init__(self,uuid,parts_list,thaw_weight,container_uuid,columns=None):
         self.uuid = uuid
-        self.parts_list = parts_list
         self.thaw_weight = thaw_weight
         self.container_uuid = container_uuid
+        self.parts = parts_list
+        self.columns = columns # (part_uuids, addresses, volumes, quantities) arrays, turned into Parts only when needed
+        self.part_uuids = set(columns[0]) if parts_list == None else {part.uuid for part in parts_list}
+        self.part_mask = 0 # One bit per part, set by the PlateList that indexes this plate
+
+    @property
+    def parts_list(self):
+        if self.parts == None:
+            self.parts = [Part(part_uuid,address,volume,quantity,self.uuid) for part_uuid,address,volume,quantity in zip(*self.columns)]
+        return self.parts
         
     def contains_part(self,part_uuid):
-        for part in self.parts_list:
-            if part_uuid == part.uuid:
-                return True
-        return False
+        return part_uuid in self.part_uuids
     
         
 class PlateList():
-    def __init__(self,plate_list):
+    def __init__(self,plate_list,part_index=None):
         self.plates = plate_list
-        
-    def contains_part_sublist(self,part_uuid_list): # Does a list of part UUIDs exist in one plate in this list?
-        part_found=False
+        if part_index == None: # Index every part in the inventory; sub lists pass the parent's index along
+            part_index = {}
+            for plate in plate_list:
+                for part_uuid in plate.part_uuids:
+                    part_index.setdefault(part_uuid,1 << len(part_index))
+            for plate in plate_list:
+                plate.part_mask = sum(part_index[part_uuid] for part_uuid in plate.part_uuids)
+        self.part_index = part_index
+        self.cached_thaw_weight = None
+        self.cached_containers = None
+
+    def sublist(self,plates):
+        return PlateList(plates,part_index=self.part_index)
+
+    def part_mask(self,part_uuid_list): # None if any part is not in the index
+        mask = 0
         for part_uuid in part_uuid_list:
-            for plate in self.plates:
-                if plate.contains_part(part_uuid):
-                    part_found=True
-                    break
-            if part_found !=True:
-                return False
-        return True
+            if part_uuid not in self.part_index:
+                return None
+            mask |= self.part_index[part_uuid]
+        return mask
+
+    def coverage(self):
+        mask = 0
+        for plate in self.plates:
+            mask |= plate.part_mask
+        return mask
+        
+    def contains_part_sublist(self,part_uuid_list): # Does every part UUID in the list exist in some plate in this list?
+        mask = self.part_mask(part_uuid_list)
+        return mask != None and mask & ~self.coverage() == 0
     
     def contains_part_list(self,parts):
         for part_uuid_list in parts:
@@ -56,10 +99,10 @@ class PlateList():
             
         return True
     
-    def get_part(self,part,volume_min=15):
+    def get_part(self,part_uuid,volume_min=15):
         for plate in self.plates:
             for part in plate.parts_list:
-                if part.uuid == part and part.volume-part.volume_used > 15:
+                if part.uuid == part_uuid and remaining_volume(part) > volume_min:
                     return part
         return False
     
@@ -70,11 +113,26 @@ class PlateList():
         return True
     
     def thaw_weight(self):
-        return sum([x.thaw_weight for x in self.plates])
+        if self.cached_thaw_weight == None:
+            self.cached_thaw_weight = sum([x.thaw_weight for x in self.plates])
+        return self.cached_thaw_weight
     
-    def containers(self):
-        return [x.container_uuid for x in self.plates]
+    def containers(self): # Distinct containers, in plate order
+        if self.cached_containers == None:
+            self.cached_containers = list(dict.fromkeys([x.container_uuid for x in self.plates]))
+        return self.cached_containers
     
+    def ranking_key(self,sort_methods,free_plates=()): # Compared lexicographically, lower is better
+        if free_plates:
+            free_uuids = {plate.uuid for plate in free_plates}
+            paid = [plate for plate in self.plates if plate.uuid not in free_uuids]
+            containers = len(set(plate.container_uuid for plate in paid) - {plate.container_uuid for plate in free_plates})
+            plates, thaw = len(paid), sum(plate.thaw_weight for plate in paid)
+        else:
+            plates, containers, thaw = len(self.plates), len(self.containers()), self.thaw_weight()
+        values = {'fewest_plates': plates, 'fewest_retrieval': containers, 'lowest_thaw_count': thaw, 'highest_thaw_count': -thaw}
+        return tuple(values[method] for method in sort_methods)
+
     def export_part_dict(self):
         parts_dict = {}
         for plate in self.plates:
@@ -83,15 +141,54 @@ class PlateList():
         return parts_dict
 
     
+inventory_sql = sqlalchemy.text("""SELECT DISTINCT part_uuid, plate_uuid, address, volume, (thaw_count + 1) * well_count AS thaw_weight, container_uuid
+        FROM stocked_inventory
+        WHERE part_uuid IN :parts
+        AND (sample_status IN :sample_status OR (:sample_status_null AND sample_status IS NULL))
+        AND (sample_evidence IN :sample_evidence OR (:sample_evidence_null AND sample_evidence IS NULL))
+        AND (plate_type IN :plate_type OR (:plate_type_null AND plate_type IS NULL))
+        """).bindparams(*[sqlalchemy.bindparam(name,expanding=True) for name in ['parts','sample_status','sample_evidence','plate_type']])
+
+engines = {}
+def inventory_engine(con): # One pooled engine per database URL instead of a new connection per build
+    if con not in engines:
+        engines[con] = sqlalchemy.create_engine(con)
+    return engines[con]
+
+def plate_list_from_frame(df): # Columnar: one factorize and sort, then slices per plate
+    if len(df) == 0:
+        return PlateList([])
+    codes, plate_uuids = pd.factorize(df['plate_uuid'].astype(str))
+    order = np.argsort(codes,kind='stable')
+    starts = np.concatenate([[0],np.flatnonzero(np.diff(codes[order])) + 1])
+    ends = np.append(starts[1:],len(order))
+    part_uuids = df['part_uuid'].astype(str).to_numpy()[order]
+    addresses = df['address'].to_numpy()[order]
+    volumes = df['volume'].to_numpy()[order]
+    thaw_weights = df['thaw_weight'].to_numpy()[order]
+    containers = df['container_uuid'].astype(str).to_numpy()[order]
+    plates = []
+    for code,(start,end) in enumerate(zip(starts,ends)):
+        plates.append(Plate(plate_uuids[code],None,thaw_weights[start],containers[start],
+            columns=(part_uuids[start:end],addresses[start:end],volumes[start:end],thaw_weights[start:end])))
+    return PlateList(plates)
+
 build_schema = build_schema = {
     'parts': {'type':'array', 'items': {'type': 'array', 'items': uuid_schema}},
     'volume': generic_num,
     'sample_status': {'type': 'array', 'items': {'type': 'string', 'enum': ['Confirmed', 'Mutated']}},
     'sample_evidence': {'type': 'array', 'items': {'type': 'string', 'enum': ['NGS','Twist_Confirmed']}},
     'plate_type': {'type': 'array', 'items': {'type': 'string', 'enum': ['glycerol_stock','distro']}}, 
-    'sort_method': {'type': 'array', 'items': {'type': 'string', 'enum': ['fewest_plates','fewest_retrieval','highest_thaw_count','lowest_thaw_count']}}
+    'sort_method': {'type': 'array', 'items': {'type': 'string', 'enum': ['fewest_plates','fewest_retrieval','highest_thaw_count','lowest_thaw_count']}},
+    'time_budget': {'type': 'number', 'minimum': 0, 'maximum': 60}, # seconds the solver may spend looking for a better cover
+    'alternatives': {'type': 'integer', 'minimum': 1, 'maximum': 10} # how many of the best plate sets to return
 }
 build_required = ['parts','volume']
+batch_schema = {
+    'builds': {'type': 'array', 'minItems': 1, 'items': {'type': 'object', 'properties': build_schema, 'required': build_required, 'additionalProperties': False}},
+    'co_optimize': {'type': 'boolean'} # let later builds reuse plates earlier builds thaw
+}
+batch_required = ['builds']
 # Request side
 class Build():
     def __init__(self,transfer_groups:list,sample_status:list=['Confirmed'],sample_evidence:list=['NGS','Twist_Confirmed'],plate_type:list=['glycerol_stock']):
@@ -101,6 +198,7 @@ class Build():
         self.plate_type = plate_type
         self.plate_list = 'Not Generated'
     validator = schema_generator(build_schema,build_required)
+    compiled_validator = compile_validator(validator)
         
     def transfer_groups_as_part(self,parts,volume):
         transfer_groups = []
@@ -130,104 +228,273 @@ class Build():
         return self.flatten(self.export_part_list())
     
     def generate_PlateList(self,con):
-        def generate_part_sql(uuid_list:list,
-                      sample_status:list,
-                      sample_evidence:list,
-                      plate_type:list):
-            def sqlval(lst):
-                return "'{}'".format('\' , \''.join(lst))
-            def lst_to_sql(field,lst):
-                if None in lst:
-                    return "AND ({} IN ({}) OR {} IS NULL)".format(field,sqlval([x for x in lst if x!=None]),field)
-                else:
-                    return "AND {} IN ({})".format(field,sqlval(lst))
-            sql_query = """SELECT DISTINCT p.uuid AS part_uuid, pl.uuid AS plate_uuid, w.address, w.volume, (pl.thaw_count + 1) * t.count AS thaw_weight, pl.container_uuid AS container_uuid
-        FROM parts AS p 
-        JOIN samples AS s ON s.part_uuid=p.uuid
-        JOIN samples_wells AS sw ON sw.samples_uuid=s.uuid
-        JOIN wells AS w ON w.uuid=sw.wells_uuid
-        JOIN plates AS pl ON pl.uuid=w.plate_uuid
-        JOIN (SELECT plate_uuid, COUNT(*) FROM wells GROUP BY plate_uuid) as t on t.plate_uuid=pl.uuid
-        WHERE p.uuid in ({}) 
-        AND pl.status = 'Stocked'
-        {}
-        {}
-        {}
-        """.format(sqlval(uuid_list),
-                   lst_to_sql("s.status",sample_status),
-                   lst_to_sql("s.evidence",sample_evidence),
-                   lst_to_sql("pl.plate_type",plate_type))
-            return sql_query
-    
-        df = pd.read_sql(generate_part_sql(self.export_flat_part_list(),self.sample_status,self.sample_evidence,self.plate_type),con)
-        plate_dict = {}
-        thaw_dict = {}
-        container_dict = {}
-        for index, row in df.iterrows():
-            plate_dict.setdefault(str(row[1]),[]).append({"part_uuid":str(row[0]), "address":row[2], "volume":row[3], "quantity":row[4]})
-            thaw_dict.setdefault(str(row[1]),row[4])
-            container_dict.setdefault(str(row[1]),str(row[5]))
-
-        plates = []
-        for k,v in plate_dict.items():
-            plates.append(Plate(k,[Part(x['part_uuid'],x['address'],x['volume'],x['quantity'],k) for x in v],thaw_dict[k],container_dict[k]))
-
-        plates = PlateList(plates)
+        df = pd.read_sql(inventory_sql,inventory_engine(con),params={
+            'parts': self.export_flat_part_list(),
+            'sample_status': [x for x in self.sample_status if x != None], 'sample_status_null': None in self.sample_status,
+            'sample_evidence': [x for x in self.sample_evidence if x != None], 'sample_evidence_null': None in self.sample_evidence,
+            'plate_type': [x for x in self.plate_type if x != None], 'plate_type_null': None in self.plate_type})
+        plates = plate_list_from_frame(df)
         self.plate_list = plates
         return plates
 
-    def plate_possibilities(self):
-        def sub_lists(lst): 
-            sublist = [[]] 
-            for i in range(len(lst) + 1):   
-                for j in range(i + 1, len(lst) + 1): 
-                    sub = lst[i:j] 
-                    sublist.append(sub) 
-            return sublist  
-
-        def combine_lists(a,b):
-            return list(itertools.product(a, b))
-        
-        return sub_lists(self.plate_list.plates)
-        
-
     ### IMPORTANT STUFF ###
-    def solutions(self):
-        solutions = [PlateList(x) for x in self.plate_possibilities() if PlateList(x).contains_part_list(self.export_part_list())]
-        return solutions
-    
-    def sorted_solutions(self,sort_methods):
-        solutions = self.solutions()
-        if 'fewest_plates' in sort_methods:
-            minimal_plate_num = min([len(x.plates) for x in solutions])
-            solutions = [x for x in solutions if len(x.plates) == minimal_plate_num]
-            
-        if 'fewest_retrieval' in sort_methods:
-            minimal_location_num = min([len(x.containers()) for x in solutions])
-            solutions = [x for x in solutions if len(x.containers()) == minimal_location_num]
-        
-        if 'highest_thaw_count' in sort_methods:
-            max_thaw = max([x.thaw_weight() for x in solutions])
-            solutions = [x for x in solutions if x.thaw_weight() == max_thaw]
-            
-        if 'lowest_thaw_count' in sort_methods:
-            min_thaw = min([x.thaw_weight() for x in solutions])
-            solutions = [x for x in solutions if x.thaw_weight() == min_thaw]
-        return solutions
-    
-    def export_solution(self,sort_methods=['fewest_plates','fewest_retrieval']):
-        solutions = self.sorted_solutions(sort_methods)
-        solution = solutions[0] # Pick first solution, might as well
-        parts_dict = solution.export_part_dict()
+    def solutions(self,sort_methods=['fewest_plates','fewest_retrieval'],time_budget=5,free_plates=(),alternatives=1,initial=None):
+        solver = PlateSolver(self.plate_list,self.export_flat_part_list(),sort_methods=sort_methods,time_budget=time_budget,free_plates=free_plates,alternatives=alternatives,initial=initial)
+        solver.solve()
+        return [self.plate_list.sublist(plates) for plates in solver.alternatives]
+    
+    def sorted_solutions(self,sort_methods,time_budget=5,free_plates=(),alternatives=1,initial=None): # Best first, one key tuple per candidate
+        solutions = self.solutions(sort_methods,time_budget=time_budget,free_plates=free_plates,alternatives=alternatives,initial=initial)
+        key = lambda x: x.ranking_key(sort_methods,free_plates)
+        if alternatives == 1:
+            return [min(solutions,key=key)]
+        return heapq.nsmallest(alternatives,solutions,key=key)
+    
+    def export_solution(self,sort_methods=['fewest_plates','fewest_retrieval'],time_budget=5,free_plates=(),alternatives=1,initial=None):
+        solutions = self.sorted_solutions(sort_methods,time_budget=time_budget,free_plates=free_plates,alternatives=alternatives,initial=initial)
+        solution = solutions[0]
+        allocator = WellAllocator(solution)
         transfer_groups = []
         for tg in self.transfer_groups:
             transfers = []
             for t in tg.transfers:
-                transfers.append({'part':t.part,'volume':t.volume,'address':parts_dict[t.part]['address'],'plate_uuid':parts_dict[t.part]['plate_uuid']})
+                well = allocator.allocate(t.part,t.volume)
+                transfers.append({'part':t.part,'volume':t.volume,'address':well.address,'plate_uuid':well.plate_uuid})
             transfer_groups.append(transfers)
-        return {'plates':[x.uuid for x in solution.plates], 'transfers':transfer_groups}
+        result = {'plates':[x.uuid for x in solution.plates], 'transfers':transfer_groups, 'shortfalls':allocator.shortfalls}
+        if alternatives > 1:
+            result['alternatives'] = [{'plates':[x.uuid for x in alternative.plates], 'containers':alternative.containers(), 'thaw_weight':int(alternative.thaw_weight())} for alternative in solutions[1:]]
+        return result
     
     
+def build_from_request(build_request):
+    build = Build([],
+            sample_status=build_request.get('sample_status', ['Confirmed']),
+            sample_evidence=build_request.get('sample_evidence',['NGS','Twist_Confirmed']),
+            plate_type=build_request.get('plate_type',['glycerol_stock'])
+            )
+    build.transfer_groups_as_part(build_request['parts'],build_request['volume'])
+    return build
+
+# Solved builds are cached with the generations of every candidate plate. A plate
+# status, thaw count or well volume change only invalidates the plans that could use
+# that plate, and those are re-solved starting from their previous plates. Plans are
+# only cached with the shared redis tier: per worker generations would miss writes made
+# through other workers, and a stale plan can send a robot to a trashed plate.
+def plan_key(build_request):
+    return '{}plan:{}'.format(response_cache.prefix,hashlib.sha256(json.dumps(build_request,sort_keys=True).encode('utf-8')).hexdigest())
+
+def solve_build(build_request,con=con): # Plain function of a validated request, so job queues can run it
+    key = plan_key(build_request)
+    plan = response_cache.get(key) if response_cache.shared != None else None
+    if plan != None and response_cache.table_generations(plan['depends']) == plan['generations']:
+        return plan['result']
+    # Read before the inventory query: if a write or a snapshot refresh lands while this
+    # build is being solved, the plan may predate it and is returned without caching
+    before = response_cache.table_generations(['inventory','snapshot'])
+    build = build_from_request(build_request)
+    build.generate_PlateList(con)
+    depends = ['inventory'] + sorted(plate_generation(plate.uuid) for plate in build.plate_list.plates)
+    result = build.export_solution(build_request.get('sort_method',['fewest_plates','fewest_retrieval']),time_budget=build_request.get('time_budget',5),alternatives=build_request.get('alternatives',1),
+            initial=plan['result']['plates'] if plan != None else None)
+    generations = response_cache.table_generations(depends)
+    if response_cache.shared != None and response_cache.table_generations(['inventory','snapshot']) == before:
+        response_cache.set(key,{'result': result, 'depends': depends, 'generations': generations},ttl=PLAN_CACHE_TTL)
+    return result
+
+# Builds with the same filters share one inventory scan and one PlateList, so wells
+# drawn from by one build have less volume left for the next. With co_optimize,
+# plates an earlier build already thaws are free for later builds.
+def solve_builds(build_requests,co_optimize=False,con=con):
+    builds = [build_from_request(build_request) for build_request in build_requests]
+    groups = {}
+    for build in builds:
+        groups.setdefault((tuple(build.sample_status),tuple(build.sample_evidence),tuple(build.plate_type)),[]).append(build)
+    for group in groups.values():
+        scan = Build([tg for build in group for tg in build.transfer_groups],sample_status=group[0].sample_status,sample_evidence=group[0].sample_evidence,plate_type=group[0].plate_type)
+        plate_list = scan.generate_PlateList(con)
+        for build in group:
+            build.plate_list = plate_list
+
+    results, errors, thawed = [], [], {}
+    for index,(build,build_request) in enumerate(zip(builds,build_requests)):
+        try:
+            result = build.export_solution(build_request.get('sort_method',['fewest_plates','fewest_retrieval']),time_budget=build_request.get('time_budget',5),alternatives=build_request.get('alternatives',1),free_plates=list(thawed.values()) if co_optimize else ())
+        except Exception as e:
+            errors.append({'index': index, 'message': 'Build failed: {}'.format(e)})
+            results.append(None)
+            continue
+        for plate in build.plate_list.plates:
+            if plate.uuid in result['plates']:
+                thawed.setdefault(plate.uuid,plate)
+        results.append(result)
+    return {'builds': results, 'plates': list(thawed), 'errors': errors}
+
+
+# Spreads transfers over every well that holds a part: each part keeps a max heap of
+# its wells by remaining volume, so a transfer takes the fullest well in O(log n).
+# A transfer that would leave less than volume_min in even the fullest well is still
+# assigned to it, and reported as a shortfall.
+class WellAllocator():
+    def __init__(self,plate_list,volume_min=15):
+        self.volume_min = volume_min
+        self.heaps = {}
+        self.shortfalls = []
+        for plate in plate_list.plates:
+            for part in plate.parts_list:
+                self.heaps.setdefault(part.uuid,[]).append((-remaining_volume(part),len(self.heaps[part.uuid]),part))
+        for heap in self.heaps.values():
+            heapq.heapify(heap)
+
+    def allocate(self,part_uuid,volume):
+        heap = self.heaps[part_uuid]
+        _,order,part = heapq.heappop(heap)
+        available = remaining_volume(part)
+        if available - volume < self.volume_min:
+            self.shortfalls.append({'part':part_uuid,'volume':volume,'available':float(max(available-self.volume_min,0)),'address':part.address,'plate_uuid':part.plate_uuid})
+        part.volume_used += volume
+        heapq.heappush(heap,(-remaining_volume(part),order,part))
+        return part
+
+
+# Set cover: the fewest plates (then containers, then thaw weight, or whatever
+# sort_methods asks for) that hold every part. Depth first branch and bound that
+# branches on the uncovered part with the fewest candidate plates, starting from
+# a greedy cover. When time_budget runs out the best cover found so far is returned.
+# With alternatives=k it keeps the k best distinct covers seen, pruning against the k-th.
+# An initial cover (the previous plan, when re-planning) seeds the bound alongside greedy.
+class PlateSolver():
+    tie_breaks = ['fewest_plates','fewest_retrieval','lowest_thaw_count']
+
+    def __init__(self,plate_list,parts,sort_methods=['fewest_plates','fewest_retrieval'],time_budget=5,free_plates=(),alternatives=1,initial=None):
+        missing = [part for part in dict.fromkeys(parts) if part not in plate_list.part_index]
+        if missing:
+            raise ValueError('No stocked wells for parts: {}'.format(', '.join(missing)))
+        self.need = plate_list.part_mask(parts)
+        self.sort_methods = list(sort_methods) + [x for x in self.tie_breaks if x not in sort_methods and not (x == 'lowest_thaw_count' and 'highest_thaw_count' in sort_methods)]
+        self.time_budget = time_budget
+        self.k = alternatives
+        self.coverage = {}
+        for plate in plate_list.plates:
+            if plate.part_mask & self.need:
+                self.coverage[plate] = plate.part_mask & self.need
+        # Plates already being thawed (for another build in a batch) add no plates, retrievals or thaws
+        free_uuids = {plate.uuid for plate in free_plates}
+        self.free = {plate for plate in self.coverage if plate.uuid in free_uuids}
+        self.free_containers = {plate.container_uuid for plate in free_plates}
+        self.free_mask = 0
+        for plate in self.free:
+            self.free_mask |= self.coverage[plate]
+        if 'highest_thaw_count' not in self.sort_methods and alternatives == 1: # Dominated plates still make runner up covers
+            self.remove_dominated()
+        self.candidates = {} # part bit -> plates holding it
+        for plate,covered in self.coverage.items():
+            while covered:
+                bit = covered & -covered
+                self.candidates.setdefault(bit,[]).append(plate)
+                covered ^= bit
+        self.min_thaw = {bit: min(self.cost(plate) for plate in plates) for bit,plates in self.candidates.items()}
+        self.total_thaw = sum(self.cost(plate) for plate in self.coverage)
+        self.optimal = None
+        self.alternatives = []
+        self.initial = [] if initial == None else [plate for plate in self.coverage if plate.uuid in set(initial)] # A previous solution to start from
+
+    def cost(self,plate):
+        return 0 if plate in self.free else plate.thaw_weight
+
+    def remove_dominated(self): # A plate is never needed if another plate in the same container covers as much for no more thaw
+        plates = sorted(self.coverage, key=lambda plate: (-popcount(self.coverage[plate]), plate not in self.free, plate.thaw_weight))
+        kept = []
+        for plate in plates:
+            covered = self.coverage[plate]
+            if not any(other.container_uuid == plate.container_uuid and (other in self.free or plate not in self.free) and self.cost(other) <= self.cost(plate) and covered & ~self.coverage[other] == 0 for other in kept):
+                kept.append(plate)
+        self.coverage = {plate: self.coverage[plate] for plate in kept}
+
+    def bits(self,mask):
+        while mask:
+            bit = mask & -mask
+            yield bit
+            mask ^= bit
+
+    def key(self,plates,uncovered=0): # Objective for a cover, or a lower bound on it for a partial one
+        paid = [plate for plate in plates if plate not in self.free]
+        thaw = sum(plate.thaw_weight for plate in paid)
+        values = {'fewest_plates': len(paid),
+                'fewest_retrieval': len(set(plate.container_uuid for plate in paid) - self.free_containers),
+                'lowest_thaw_count': thaw,
+                'highest_thaw_count': -thaw}
+        if uncovered:
+            best_gain = max(popcount(covered & uncovered) for covered in self.coverage.values())
+            values['fewest_plates'] += -(-popcount(uncovered & ~self.free_mask) // best_gain)
+            values['lowest_thaw_count'] += max(self.min_thaw[bit] for bit in self.bits(uncovered))
+            values['highest_thaw_count'] = -self.total_thaw
+        return tuple(values[method] for method in self.sort_methods)
+
+    def greedy(self):
+        chosen, uncovered = [], self.need
+        while uncovered:
+            plate = max(self.coverage, key=lambda plate: (plate in self.free and self.coverage[plate] & uncovered != 0, popcount(self.coverage[plate] & uncovered), -self.cost(plate)))
+            chosen.append(plate)
+            uncovered &= ~self.coverage[plate]
+        return chosen
+
+    def minimal(self,plates): # Drop plates the rest already cover, costliest first
+        plates = list(plates)
+        for plate in sorted(plates, key=lambda plate: (plate in self.free, -self.cost(plate))):
+            rest = 0
+            for other in plates:
+                if other is not plate:
+                    rest |= self.coverage[other]
+            if self.need & ~rest == 0:
+                plates.remove(plate)
+        return plates
+
+    def solve(self):
+        deadline = time.monotonic() + self.time_budget
+        top = [] # (key, order, plates), best first, at most k long
+        order = itertools.count()
+        self.optimal = True
+
+        def full():
+            return len(top) == self.k
+
+        def offer(plates):
+            if full() and self.key(plates) >= top[-1][0]:
+                return
+            plates = self.minimal(plates)
+            key = self.key(plates)
+            if (full() and key >= top[-1][0]) or any(set(plates) == set(other) for _,_,other in top):
+                return
+            bisect.insort(top,(key,next(order),plates))
+            del top[self.k:]
+
+        def search(chosen,uncovered,excluded):
+            if time.monotonic() > deadline:
+                self.optimal = False
+                return
+            if not uncovered:
+                offer(chosen)
+                return
+            if full() and self.key(chosen,uncovered) >= top[-1][0]:
+                return
+            bit = min(self.bits(uncovered), key=lambda bit: len(self.candidates[bit]))
+            branches = sorted([plate for plate in self.candidates[bit] if plate not in excluded], key=lambda plate: (plate not in self.free, -popcount(self.coverage[plate] & uncovered), self.cost(plate)))
+            excluded = set(excluded)
+            for plate in branches:
+                search(chosen + [plate], uncovered & ~self.coverage[plate], excluded)
+                excluded.add(plate) # Later siblings never pick it again, so no cover is explored twice
+
+        covered = 0
+        for plate in self.initial:
+            covered |= self.coverage[plate]
+        if self.initial != [] and covered == self.need:
+            offer(self.initial)
+        offer(self.greedy())
+        search([],self.need,set())
+        self.alternatives = [plates for _,_,plates in top]
+        return self.alternatives[0]
+
 class TransferGroup():
     def __init__(self,transfers):
         self.transfers = transfers
@@ -4,7 +4,6 @@ from collections import Counter
 
 import hashlib
 import numpy as np
-from jsonschema import validate
 
 import shippo
 
@@ -14,14 +13,23 @@ importer = DictImporter()
 
 from .models import *
 from flask_restplus import Api, Resource, fields, Namespace 
-from flask import Flask, abort, request, jsonify, g, url_for, redirect
+from flask import Flask, abort, request, g, url_for, redirect, Response, stream_with_context
+from . import encoder
+from .encoder import jsonify
+from .cache import cached, touch_tables
+from sqlalchemy import tuple_
+from sqlalchemy.orm import selectinload, load_only, lazyload
+import base64
+import datetime
 
 from .config import PREFIX
 from .config import LOGIN_KEY
 from .config import SPACES
 from .config import BUCKET
 from .config import SHIPPO_KEY
-from .optimal_selection import Build
+from .config import DOWNLOAD_REDIRECT
+from .optimal_selection import Build, solve_build, solve_builds, batch_schema, batch_required
+from .jobs import jobs, jobs_unavailable
 #from dna_designer import moclo, codon
 
 #from .sequence import sequence
@@ -32,7 +40,7 @@ from .optimal_selection import Build
 import os
 import jwt
 from functools import wraps
-from flask import make_response, jsonify
+from flask import make_response
 PUBLIC_KEY = os.environ['PUBLIC_KEY']
 def requires_auth(roles): # Remove ability to send token as parameter in request
     def requires_auth_decorator(f):
@@ -69,100 +77,389 @@ class ResourceRoute(Resource):
 
 
 
-def request_to_class(dbclass,json_request): # Make classmethod
-    tags = []
-    for k,v in json_request.items():
-        if k == 'tags' and v != []:
-            dbclass.tags = []
-            set_tags = list(set(v))
-            for tag in set_tags:
-
-                tags_in_db = Tag.query.filter_by(tag=tag).all()
-                if len(tags_in_db) == 0:
-                    tags.append(Tag(tag=tag))
-                else:
-                    tags.append(tags_in_db[0])
-            for tag in tags:
-                dbclass.tags.append(tag)
-        elif k == 'files' and v != []:
-            for file_uuid in v:
-                files_in_db = File.query.filter_by(uuid=file_uuid).first()
-                if len(files_in_db) == 0:
-                    pass
-                else: 
-                    dbclass.files.append(files_in_db[0])
-        elif k == 'plates' and v != []:
-            dbclass.plates = []
-            [dbclass.plates.append(Plate.query.filter_by(uuid=uuid).first()) for uuid in v]
-        elif k == 'samples':
-            if v != []:
-                dbclass.samples = []
-                [dbclass.samples.append(Sample.query.filter_by(uuid=uuid).first()) for uuid in v] # In order to sue
-        elif k == 'wells' and v != []:
-            dbclass.wells = []
-            [dbclass.samples.append(Well.query.filter_by(uuid=uuid).first()) for uuid in v]
-        elif k == 'platesets' and v != []:
-            dbclass.platesets = []
-            [dbclass.platesets.append(PlateSet.query.filter_by(uuid=uuid).first()) for uuid in v]
-        elif k == 'distributions' and v != []:
-            dbclass.distributions = []
-            [dbclass.distributions.append(Distribution.query.filter_by(uuid=uuid).first()) for uuid in v]
-        else:
-            setattr(dbclass,k,v)
+class MissingRelationship(Exception):
+    def __init__(self,missing):
+        self.missing = missing # {key: [uuids not found]}
+        super().__init__('UUIDs not found: {}'.format(missing))
+
+relationship_classes = {'files': Files, 'plates': Plate, 'samples': Sample, 'wells': Well, 'platesets': PlateSet, 'distributions': Distribution}
+
+def resolve_tags(tag_list): # One select for the existing tags, one batched insert for the rest
+    tag_list = list(dict.fromkeys(tag_list))
+    found = {tag.tag: tag for tag in Tag.query.filter(Tag.tag.in_(tag_list))}
+    new_tags = [Tag(uuid=uuid.uuid4(),tag=tag) for tag in tag_list if tag not in found]
+    if new_tags != []:
+        db.session.add_all(new_tags)
+        found.update({tag.tag: tag for tag in new_tags})
+    return [found[tag] for tag in tag_list]
+
+def resolve_requests(json_requests): # Tags and related objects for every request at once, one query per key
+    resolved = {}
+    tag_list = [tag for json_request in json_requests for tag in json_request.get('tags') or []]
+    if tag_list != []:
+        resolved['tags'] = {tag.tag: tag for tag in resolve_tags(tag_list)}
+    for k,cls in relationship_classes.items():
+        uuid_list = list(dict.fromkeys(str(u) for json_request in json_requests for u in json_request.get(k) or []))
+        if uuid_list != []:
+            resolved[k] = {str(obj.uuid): obj for obj in cls.query.filter(cls.uuid.in_(uuid_list))}
+    return resolved
+
+def request_to_class(dbclass,json_request,resolved=None): # Make classmethod
+    missing = {}
+    with db.session.no_autoflush: # dbclass may already be pending through a backref and is not complete yet
+        if resolved == None:
+            resolved = resolve_requests([json_request])
+        for k,v in json_request.items():
+            if k == 'tags' and v != []:
+                dbclass.tags = [resolved['tags'][tag] for tag in dict.fromkeys(v)]
+            elif k in relationship_classes and v != []:
+                found = resolved[k]
+                not_found = [u for u in v if str(u) not in found]
+                if not_found != []:
+                    missing[k] = not_found
+                setattr(dbclass,k,[found[str(u)] for u in v if str(u) in found])
+            else:
+                setattr(dbclass,k,v)
+    if missing != {}:
+        raise MissingRelationship(missing)
     return dbclass
 
-def crud_get_list(cls,full=None):
-    return jsonify([obj.toJSON(full=full) for obj in cls.query.all()])
+# Keyset pagination
+STREAM_BATCH_SIZE = 500
+
+def keyset_columns(cls): # (time_created, uuid), or just uuid for tables without time_created
+    if hasattr(cls,'time_created'):
+        return [cls.time_created, cls.uuid]
+    return [cls.uuid]
+
+def keyset_order(cls): # Matches the ix_<table>_keyset indexes, rows without time_created come first
+    if hasattr(cls,'time_created'):
+        return [cls.time_created.asc().nullsfirst(), cls.uuid]
+    return [cls.uuid]
+
+def keyset_after(cls,values): # Rows that sort after a decoded cursor
+    if len(values) == 1:
+        return cls.uuid > values[0]
+    if values[0] == None:
+        return sqlalchemy.or_(cls.time_created != None, sqlalchemy.and_(cls.time_created == None, cls.uuid > values[1]))
+    return tuple_(cls.time_created,cls.uuid) > tuple_(*values)
+
+def encode_cursor(obj):
+    values = [str(obj.uuid)]
+    if hasattr(obj,'time_created'):
+        values.insert(0,obj.time_created.isoformat() if obj.time_created != None else None)
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('utf-8')
+
+def decode_cursor(cls,cursor):
+    values = json.loads(base64.urlsafe_b64decode(cursor.encode('utf-8')).decode('utf-8'))
+    if len(values) != len(keyset_columns(cls)):
+        raise ValueError('Cursor does not match {}'.format(cls.__tablename__))
+    if hasattr(cls,'time_created') and values[0] != None:
+        values[0] = datetime.datetime.fromisoformat(values[0])
+    return values
+
+def requested_fields(cls): # fields= query parameter, or None to serialize with toJSON
+    fields = request.args.get('fields')
+    if fields == None:
+        return None
+    fields = [field for field in fields.split(',') if field != '']
+    unknown = [field for field in fields if field not in cls.__table__.columns and not (field == 'tags' and hasattr(cls,'tags'))]
+    if unknown != []:
+        raise ValueError('Unknown fields: {}'.format(', '.join(unknown)))
+    return ['uuid'] + [field for field in fields if field != 'uuid']
+
+def list_fields(cls): # What toJSON returns, minus the heavy columns
+    fields = [column for column in cls.__table__.columns.keys() if column not in cls.heavy_columns]
+    if hasattr(cls,'tags'):
+        fields.append('tags')
+    return fields
+
+def sparse_json(obj,fields):
+    return {field: [tag.tag for tag in obj.tags] if field == 'tags' else getattr(obj,field) for field in fields}
+
+def crud_query(cls,full=None,fields=None,stream=False):
+    query = cls.query
+    if fields != None: # Only select the requested columns (plus the keyset columns)
+        columns = [field for field in fields if field != 'tags'] + (['time_created'] if hasattr(cls,'time_created') else [])
+        query = query.options(load_only(*columns))
+        # Eager relationships that were not asked for would still be loaded for every row
+        query = query.options(*[selectinload(getattr(cls,rel.key)) if rel.key in fields else lazyload(getattr(cls,rel.key)) for rel in sqlalchemy.inspect(cls).relationships])
+    elif full == 'full': # Relationships walked by toJSON(full='full') are loaded in bulk rather than per row
+        query = query.options(*[selectinload(getattr(cls,rel)) for rel in getattr(cls,'full_relationships',[])])
+    if stream == True and fields == None: # yield_per cannot be combined with subquery eager loads, so swap them for selectin
+        query = query.options(*[selectinload(getattr(cls,rel.key)) for rel in sqlalchemy.inspect(cls).relationships if rel.lazy == 'subquery'])
+    return query
 
-def crud_post(cls,post,database):
-    obj = request_to_class(cls(),post)
+def crud_get_list(cls,full=None):
+    limit = request.args.get('limit')
+    after = request.args.get('after')
+    stream = request.args.get('format') == 'ndjson'
+    try:
+        fields = requested_fields(cls)
+    except ValueError as e:
+        return make_response(jsonify({'message': str(e)}),400)
+    if fields == None and full == None and hasattr(cls,'heavy_columns'):
+        fields = list_fields(cls)
+    def serialize(obj):
+        return obj.toJSON(full=full) if fields == None else sparse_json(obj,fields)
+
+    if limit == None and after == None and stream == False:
+        return jsonify([serialize(obj) for obj in crud_query(cls,full=full,fields=fields).all()])
+
+    query = crud_query(cls,full=full,fields=fields,stream=stream).order_by(*keyset_order(cls))
+    keys = db.session.query(*keyset_columns(cls)).order_by(*keyset_order(cls))
+    try:
+        if after != None:
+            query = query.filter(keyset_after(cls,decode_cursor(cls,after)))
+            keys = keys.filter(keyset_after(cls,decode_cursor(cls,after)))
+        if limit != None:
+            limit = int(limit)
+            if limit < 1:
+                raise ValueError('limit must be positive')
+    except Exception as e:
+        return make_response(jsonify({'message': 'Bad pagination parameters: {}'.format(e)}),400)
+
+    if stream == True:
+        headers = {}
+        if limit != None:
+            query = query.limit(limit)
+            # Headers go out before the body, so find the page's last key with an index-only lookup first
+            last = keys.offset(limit-1).limit(2).all()
+            if len(last) == 2:
+                headers['X-Next-Cursor'] = encode_cursor(last[0])
+        query = query.execution_options(stream_results=True).yield_per(STREAM_BATCH_SIZE)
+        def generate():
+            for obj in query:
+                yield encoder.dumps(serialize(obj)) + b'\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson', headers=headers)
+
+    objs = query.limit(limit+1).all() if limit != None else query.all()
+    response = jsonify([serialize(obj) for obj in objs[:limit]])
+    if limit != None and len(objs) > limit:
+        response.headers['X-Next-Cursor'] = encode_cursor(objs[limit-1])
+    return response
+
+def post_checks(cls,obj,post): # Returns an error message, or None if obj can be saved
     if cls in Schema.schema_classes:
-        schema = Schema.query.filter_by(uuid=request.get_json()['schema_uuid']).first()
         try:
-            validate(instance=request.get_json()['data'],schema=schema.schema)
+            schema_validator(post['schema_uuid']).validate(post['data'])
         except Exception as e:
-            return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
+            return 'Schema validation failed: {}'.format(e)
 
     if cls == Schema:
-        obj.schema_hash = hashlib.sha256(json.dumps(request.get_json()['schema']).encode('utf-8')).hexdigest()
+        obj.schema_hash = schema_hash(post['schema'])
         hash_matches = Schema.query.filter_by(schema_hash=obj.schema_hash).all()
         if len(hash_matches) != 0:
-            return make_response(jsonify({'message': 'Schema hash present in db'}),400)
+            return 'Schema hash present in db'
+    return None
+
+def crud_post(cls,post,database):
+    try:
+        obj = request_to_class(cls(),post)
+    except MissingRelationship as e:
+        database.session.rollback()
+        return make_response(jsonify({'message': 'UUIDs not found', 'missing': e.missing}),404)
+    message = post_checks(cls,obj,post)
+    if message != None:
+        return make_response(jsonify({'message': message}),400)
     database.session.add(obj)
     database.session.commit()
     return jsonify(obj.toJSON())
 
+def crud_post_bulk(cls,posts,database,validate_json=False):
+    if type(posts) != list or len(posts) == 0:
+        return make_response(jsonify({'message': 'Bulk create expects a non-empty array'}),400)
+    errors = []
+    for index,post in enumerate(posts):
+        if type(post) != dict:
+            errors.append({'index': index, 'message': 'Item is not an object'})
+            continue
+        if validate_json == True:
+            try:
+                cls.compiled_validator.validate(post)
+            except Exception as e:
+                errors.append({'index': index, 'message': 'Schema validation failed: {}'.format(e)})
+
+    if errors == []:
+        requested = [str(post['uuid']) for post in posts if 'uuid' in post]
+        taken = {str(obj.uuid) for obj in database.session.query(cls.uuid).filter(cls.uuid.in_(requested))} if requested != [] else set()
+        seen = set()
+        for index,post in enumerate(posts):
+            if 'uuid' in post:
+                if str(post['uuid']) in taken or str(post['uuid']) in seen:
+                    errors.append({'index': index, 'message': 'UUID taken'})
+                seen.add(str(post['uuid']))
+    if errors != []:
+        return make_response(jsonify({'message': 'Bulk create failed', 'errors': errors}),400)
+
+    objs = []
+    with database.session.no_autoflush:
+        resolved = resolve_requests(posts) # Shared, so a new tag used by several items is created once
+    for index,post in enumerate(posts):
+        post = dict(post)
+        post.setdefault('uuid',str(uuid.uuid4())) # Client side keys let the inserts go out as one batch
+        try:
+            obj = request_to_class(cls(),post,resolved)
+        except MissingRelationship as e:
+            errors.append({'index': index, 'message': 'UUIDs not found', 'missing': e.missing})
+            continue
+        message = post_checks(cls,obj,post)
+        if message != None:
+            errors.append({'index': index, 'message': message})
+        objs.append(obj)
+    if errors != []:
+        database.session.rollback()
+        return make_response(jsonify({'message': 'Bulk create failed', 'errors': errors}),400)
+
+    try:
+        database.session.add_all(objs)
+        database.session.commit()
+    except Exception as e:
+        database.session.rollback()
+        return make_response(jsonify({'message': 'Bulk create failed: {}'.format(e)}),400)
+    return jsonify({'success': True, 'uuids': [str(obj.uuid) for obj in objs]})
+
 def crud_get(cls,uuid,full=None,jsonify_results=True):
-    obj = cls.query.filter_by(uuid=uuid).first()
+    try:
+        fields = requested_fields(cls) if jsonify_results == True else None
+    except ValueError as e:
+        return make_response(jsonify({'message': str(e)}),400)
+    obj = crud_query(cls,full=full,fields=fields).filter_by(uuid=uuid).first()
     if obj == None:
         return jsonify([])
     if jsonify_results == True:
-        return jsonify(obj.toJSON(full=full))
+        return jsonify(obj.toJSON(full=full) if fields == None else sparse_json(obj,fields))
     else:
         return obj
 
+def delete_candidates(cls,uuid_list,constraints={}): # One anti-join query: {uuid: blocked} for the uuids that exist
+    checks = []
+    for constraint in constraints.get('delete',[]):
+        referrer = sqlalchemy.orm.aliased(cls)
+        checks.append(sqlalchemy.exists().where(getattr(referrer,constraint) == cls.uuid))
+    for rel in sqlalchemy.inspect(cls).relationships: # Rows that point here through a NOT NULL foreign key block the delete too
+        if rel.direction == sqlalchemy.orm.interfaces.ONETOMANY and rel.secondary is None:
+            for local,remote in rel.local_remote_pairs:
+                if remote.nullable == False and all(fk.ondelete == None for fk in remote.foreign_keys):
+                    referrer = remote.table.alias()
+                    checks.append(sqlalchemy.exists().where(referrer.c[remote.name] == local))
+    blocked = sqlalchemy.or_(*checks) if checks != [] else sqlalchemy.false()
+    return {str(row[0]): row[1] for row in db.session.query(cls.uuid,blocked).filter(cls.uuid.in_(uuid_list))}
+
 def crud_delete(cls,uuid,database,constraints={}):
-    if constraints != {}:
-        for constraint in constraints['delete']:
-            if cls.query.filter_by(**{constraint: uuid}).first() != None:
-                return make_response(jsonify({'message': 'UUID used elsewhere'}),501)
+    candidates = delete_candidates(cls,[uuid],constraints)
+    if candidates == {}:
+        return make_response(jsonify({'message': 'UUID not found'}),404)
+    if True in candidates.values():
+        return make_response(jsonify({'message': 'UUID used elsewhere'}),501)
     database.session.delete(cls.query.get(uuid))
     database.session.commit()
     return jsonify({'success':True})
 
+def crud_delete_bulk(cls,uuid_list,database,constraints={}):
+    if type(uuid_list) != list or len(uuid_list) == 0:
+        return make_response(jsonify({'message': 'Bulk delete expects a non-empty array of UUIDs'}),400)
+    uuid_list = list(dict.fromkeys(str(uuid) for uuid in uuid_list))
+    candidates = delete_candidates(cls,uuid_list,constraints)
+    eligible = [uuid for uuid,blocked in candidates.items() if blocked == False]
+    try:
+        if eligible != []:
+            touched = {cls.__tablename__}
+            for rel in sqlalchemy.inspect(cls).relationships: # query.delete() skips the ORM, so clear association rows first
+                if rel.secondary is not None:
+                    for column in rel.secondary.columns:
+                        if column.references(cls.__table__.c.uuid):
+                            database.session.execute(rel.secondary.delete().where(column.in_(eligible)))
+                            touched.add(rel.secondary.name)
+            cls.query.filter(cls.uuid.in_(eligible)).delete(synchronize_session=False)
+            if cls.__tablename__ in inventory_tables:
+                touched.add('inventory')
+            touch_tables(database.session,touched)
+        database.session.commit()
+    except Exception as e:
+        database.session.rollback()
+        return make_response(jsonify({'message': 'Bulk delete failed: {}'.format(e)}),400)
+    return jsonify({'success': True,
+        'deleted': eligible,
+        'blocked': [uuid for uuid,blocked in candidates.items() if blocked == True],
+        'not_found': [uuid for uuid in uuid_list if uuid not in candidates]})
+
 def crud_put(cls,uuid,post,database):
     obj = cls.query.filter_by(uuid=uuid).first()
     if cls in Schema.schema_classes:
-        schema = Schema.query.filter_by(uuid=obj.schema_uuid).first()
         try:
-            validate(instance=obj.data,schema=schema.schema)
+            schema_validator(post.get('schema_uuid',obj.schema)).validate(post.get('data',obj.data))
         except Exception as e:
             return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
-
-    updated_obj = request_to_class(obj,post)
+    if cls == Schema and 'schema' in post:
+        schema_validators.pop(obj.schema_hash)
+        obj.schema_hash = schema_hash(post['schema'])
+
+    try:
+        updated_obj = request_to_class(obj,post)
+    except MissingRelationship as e:
+        database.session.rollback()
+        return make_response(jsonify({'message': 'UUIDs not found', 'missing': e.missing}),404)
+    if hasattr(cls,'time_updated'): # Relationship-only changes would not trigger onupdate, and ETags rely on it
+        obj.time_updated = func.now()
     db.session.commit()
     return jsonify(obj.toJSON())
 
+# Conditional GETs
+def modified_column(cls):
+    return func.coalesce(cls.time_updated,cls.time_created)
+
+def conditional_state(cls,uuid=None,full=None): # (etag, last_modified) from aggregates that move whenever the response would
+    if not hasattr(cls,'time_updated'):
+        return None
+    query = db.session.query(func.max(modified_column(cls)),func.count(cls.uuid))
+    if uuid != None:
+        query = query.filter(cls.uuid == uuid)
+    state = [tuple(query.first())]
+    if state[0][1] == 0 and uuid != None:
+        return None
+    if full == 'full':
+        for rel in getattr(cls,'full_relationships',[]):
+            target = sqlalchemy.inspect(cls).relationships[rel].mapper.class_
+            query = db.session.query(func.max(modified_column(target)),func.count(target.uuid)).select_from(cls).join(getattr(cls,rel))
+            if uuid != None:
+                query = query.filter(cls.uuid == uuid)
+            state.append(tuple(query.first()))
+    times = [row[0] for row in state if row[0] != None]
+    etag = hashlib.sha1('{}{}'.format(request.full_path,state).encode('utf-8')).hexdigest()
+    if uuid == None or full == 'full': # Deleting a row never moves max(time_updated), only the counts in the etag see it
+        return etag, None
+    return etag, max(times) if times != [] else None
+
+def not_modified_since(last_modified):
+    since = request.if_modified_since
+    if since == None or last_modified == None:
+        return False
+    if since.tzinfo == None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    return last_modified.replace(microsecond=0) <= since
+
+def conditional_get(cls,build_response,uuid=None,full=None): # Answers If-None-Match/If-Modified-Since with a 304 before building the response
+    state = conditional_state(cls,uuid=uuid,full=full)
+    if state == None:
+        return build_response()
+    etag, last_modified = state
+    if request.if_none_match.contains(etag) or (not request.if_none_match and not_modified_since(last_modified)):
+        response = make_response('',304)
+    else:
+        response = build_response()
+        if response.status_code != 200:
+            return response
+    response.set_etag(etag)
+    if last_modified != None:
+        response.last_modified = last_modified
+    return response
+
+list_params = {'limit': 'Page size, enables keyset pagination (next page cursor in X-Next-Cursor)',
+        'after': 'Cursor from X-Next-Cursor',
+        'format': 'ndjson to stream one object per line',
+        'fields': 'Comma separated columns to return (heavy columns are left out of list views unless asked for)'}
+
 class CRUD():
     def __init__(self, namespace, cls, model, name, constraints={}, security='token',validate_json=False, custom_post=False):
         self.ns = namespace
@@ -174,9 +471,9 @@ class CRUD():
         if custom_post == False:
             @self.ns.route('/')
             class ListRoute(Resource):
-                @self.ns.doc('{}_list'.format(self.name))
+                @self.ns.doc('{}_list'.format(self.name),params=list_params)
                 def get(self):
-                    return crud_get_list(cls)
+                    return conditional_get(cls,lambda: crud_get_list(cls))
             
                 @self.ns.doc('{}_create'.format(self.name),security=security)
                 @self.ns.expect(model)
@@ -188,7 +485,7 @@ class CRUD():
                         return make_response(jsonify({'message': 'Bad json formatting: {}'.format(e)}),400)
                     if validate_json == True:
                         try:
-                            validate(instance=request.get_json(),schema=cls.validator)
+                            cls.compiled_validator.validate(request.get_json())
                         except Exception as e:
                             return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
                     if 'uuid' in request.get_json():
@@ -197,14 +494,29 @@ class CRUD():
                         else:
                             return make_response(jsonify({'message': 'UUID taken'}),501)
                     return crud_post(cls,request.get_json(),db)
+
         else:
             pass
 
+        @self.ns.route('/bulk')
+        class BulkRoute(Resource):
+            @self.ns.doc('{}_bulk_create'.format(self.name),security=security)
+            @requires_auth(['moderator','admin'])
+            def post(self):
+                if custom_post == True:
+                    return make_response(jsonify({'message': 'Bulk create is not available for {}'.format(name)}),405)
+                return crud_post_bulk(cls,request.get_json(),db,validate_json=validate_json)
+
+            @self.ns.doc('{}_bulk_delete'.format(self.name),security=security)
+            @requires_auth(['moderator','admin'])
+            def delete(self):
+                return crud_delete_bulk(cls,request.get_json(),db,constraints)
+
         @self.ns.route('/<uuid>')
         class NormalRoute(Resource):
-            @self.ns.doc('{}_get'.format(self.name))
+            @self.ns.doc('{}_get'.format(self.name),params={'fields': list_params['fields']})
             def get(self,uuid):
-                return crud_get(cls,uuid)
+                return conditional_get(cls,lambda: crud_get(cls,uuid),uuid=uuid)
 
             @self.ns.doc('{}_delete'.format(self.name),security=security)
             @requires_auth(['moderator','admin'])
@@ -219,15 +531,15 @@ class CRUD():
 
         @self.ns.route('/full/')
         class FullListRoute(Resource):
-            @self.ns.doc('{}_full'.format(self.name))
+            @self.ns.doc('{}_full'.format(self.name),params=list_params)
             def get(self):
-                return crud_get_list(cls,full='full')
+                return conditional_get(cls,lambda: crud_get_list(cls,full='full'),full='full')
 
         @self.ns.route('/full/<uuid>')
         class FullRoute(Resource):
-            @self.ns.doc('{}_full_single'.format(self.name))
+            @self.ns.doc('{}_full_single'.format(self.name),params={'fields': list_params['fields']})
             def get(self,uuid):
-                return crud_get(cls,uuid,full='full')
+                return conditional_get(cls,lambda: crud_get(cls,uuid,full='full'),uuid=uuid,full='full')
 
         @self.ns.route('/validator')
         class ValidatorRoute(Resource):
@@ -260,6 +572,7 @@ CRUD(ns_collection,Collection,collection_model,'collection')
 class CollectionAllRoute(Resource):
     '''Shows a collection all the way down to the root'''
     @ns_collection.doc('collection_get_all')
+    @cached('collections','parts','samples','tags')
     def get(self,uuid):
         '''Get a single collection and everything down the tree'''
         def recursive_down(collection):
@@ -300,6 +613,7 @@ class CollectionPartStatus(Resource):
 @ns_collection.route('/parts_with_confirmed_samples/<uuid>')
 class CollectionSampleStatus(Resource):
     @ns_collection.doc('collection_get_confirmed_parts')
+    @cached('parts','samples')
     def get(self,uuid):
         sql_query = """SELECT s.part_uuid 
         FROM samples AS s
@@ -367,26 +681,75 @@ class PartLocations(Resource):
 build_model = ns_part.schema_model('build',Build.validator)
 @ns_part.route('/query_transfers')
 class PartTransfers(Resource):
+    @ns_part.doc(params={'async': '1 to queue the build and return a job id instead of waiting for it'})
     @ns_part.expect(build_model)
     def post(self):
         build_request = request.get_json()
         try:
-            validate(instance=build_request,schema=Build.validator)
+            Build.compiled_validator.validate(build_request)
         except Exception as e:
             return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
         
+        if request.args.get('async') in ['1','true']:
+            if jobs == None:
+                return make_response(jsonify(jobs_unavailable()),501)
+            job_id = jobs.enqueue(solve_build,build_request)
+            return make_response(jsonify({'job_id': job_id, 'status': 'queued'}),202)
         try:
-            build = Build([],
-                    sample_status=build_request.setdefault('sample_status', ['Confirmed']),
-                    sample_evidence=build_request.setdefault('sample_evidence',['NGS','Twist_Confirmed']),
-                    plate_type=build_request.setdefault('plate_type',['glycerol_stock'])
-                    )
-            build.transfer_groups_as_part(build_request['parts'],build_request['volume'])
-            build.generate_PlateList(os.environ['URL'])
-            return jsonify(build.export_solution())
+            return jsonify(solve_build(build_request,os.environ['URL']))
         except Exception as e:
             return make_response(jsonify({'message': 'Build failed: {}'.format(e)}),400)
 
+batch_validator = schema_generator(batch_schema,batch_required)
+compiled_batch_validator = compile_validator(batch_validator)
+batch_model = ns_part.schema_model('build_batch',batch_validator)
+@ns_part.route('/query_transfers/batch')
+class PartTransfersBatch(Resource):
+    @ns_part.doc(params={'async': '1 to queue the batch and return a job id instead of waiting for it'})
+    @ns_part.expect(batch_model)
+    def post(self):
+        batch_request = request.get_json()
+        try:
+            compiled_batch_validator.validate(batch_request)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
+
+        if request.args.get('async') in ['1','true']:
+            if jobs == None:
+                return make_response(jsonify(jobs_unavailable()),501)
+            job_id = jobs.enqueue(solve_builds,batch_request['builds'],batch_request.get('co_optimize',False))
+            return make_response(jsonify({'job_id': job_id, 'status': 'queued'}),202)
+        try:
+            return jsonify(solve_builds(batch_request['builds'],batch_request.get('co_optimize',False),os.environ['URL']))
+        except Exception as e:
+            return make_response(jsonify({'message': 'Build failed: {}'.format(e)}),400)
+
+@ns_part.route('/query_transfers/<job_id>')
+class PartTransfersJob(Resource):
+    def get(self,job_id):
+        if jobs == None:
+            return make_response(jsonify(jobs_unavailable()),501)
+        status = jobs.status(job_id)
+        if status == None:
+            return make_response(jsonify({'message': 'Job {} not found'.format(job_id)}),404)
+        status.pop('result',None)
+        status['job_id'] = job_id
+        return jsonify(status)
+
+@ns_part.route('/query_transfers/<job_id>/result')
+class PartTransfersJobResult(Resource):
+    def get(self,job_id):
+        if jobs == None:
+            return make_response(jsonify(jobs_unavailable()),501)
+        status = jobs.status(job_id)
+        if status == None:
+            return make_response(jsonify({'message': 'Job {} not found'.format(job_id)}),404)
+        if status['status'] == 'failed':
+            return make_response(jsonify({'message': 'Build failed: {}'.format(status['message'])}),400)
+        if status['status'] != 'finished':
+            return make_response(jsonify({'job_id': job_id, 'status': status['status']}),202)
+        return jsonify(status['result'])
+
 
 
         
@@ -440,6 +803,7 @@ class SingleFile(Resource):
         file = Files.query.get(uuid)
         print(type(SPACES))
         SPACES.delete_object(Bucket=BUCKET,Key=file.file_name)
+        object_metadata_cache.pop(file.file_name)
         db.session.delete(file)
         db.session.commit()
         return jsonify({'success':True})
@@ -457,10 +821,79 @@ class NewFile(Resource):
         db.session.commit()
         return jsonify(new_file.toJSON())
 
+@ns_file.route('/upload/stream')
+class StreamFile(Resource):
+    @ns_file.doc('stream_file',security='token',params={'name': 'Name to display for the file'})
+    @requires_auth(['moderator','admin'])
+    def post(self):
+        '''Upload the raw request body, streamed to spaces as it arrives'''
+        name = request.args.get('name')
+        if name == None:
+            return make_response(jsonify({'message': 'Query parameter name is required'}),400)
+        file_name = str(uuid.uuid4())
+        try:
+            size = multipart_upload(SPACES,request.stream,file_name,content_type=content_type(name))
+        except Exception as e:
+            return make_response(jsonify({'message': 'Upload failed: {}'.format(e)}),500)
+        new_file = Files(name,file_name=file_name,size=size)
+        db.session.add(new_file)
+        db.session.commit()
+        return jsonify(new_file.toJSON())
+
+presign_validator = compile_validator(schema_generator(presign_schema,presign_required))
+finalize_validator = compile_validator(schema_generator(finalize_schema,finalize_required))
+presign_model = ns_file.schema_model('presign_upload',schema_generator(presign_schema,presign_required))
+finalize_model = ns_file.schema_model('finalize_upload',schema_generator(finalize_schema,finalize_required))
+
+@ns_file.route('/upload/presigned')
+class PresignedFile(Resource):
+    @ns_file.doc('presign_file',security='token')
+    @ns_file.expect(presign_model)
+    @requires_auth(['moderator','admin'])
+    def post(self):
+        '''Presigned PUT (or one per part, for a size above the part size) to upload to spaces directly'''
+        post = request.get_json()
+        try:
+            presign_validator.validate(post)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
+        try:
+            return jsonify(presign_upload(SPACES,post['name'],post.get('size')))
+        except Exception as e:
+            return make_response(jsonify({'message': 'Presign failed: {}'.format(e)}),400)
+
+@ns_file.route('/upload/presigned/finalize')
+class FinalizePresignedFile(Resource):
+    @ns_file.doc('finalize_file',security='token')
+    @ns_file.expect(finalize_model)
+    @requires_auth(['moderator','admin'])
+    def post(self):
+        '''Complete a presigned upload and create its file'''
+        post = request.get_json()
+        try:
+            finalize_validator.validate(post)
+        except Exception as e:
+            return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
+        if Files.query.filter_by(file_name=post['file_name']).first() != None:
+            return make_response(jsonify({'message': 'File already finalized'}),400)
+        try:
+            size = finalize_upload(SPACES,post['file_name'],post.get('upload_id'),post.get('parts'))
+        except Exception as e:
+            return make_response(jsonify({'message': 'Upload not found or incomplete: {}'.format(e)}),400)
+        new_file = Files(post['name'],file_name=post['file_name'],size=size)
+        db.session.add(new_file)
+        db.session.commit()
+        return jsonify(new_file.toJSON())
+
 @ns_file.route('/download/<uuid>')
 class DownloadFile(Resource):
+    @ns_file.doc(params={'redirect': 'true to be redirected to a short lived presigned url instead of streaming through the API'})
     def get(self,uuid):
         obj = Files.query.filter_by(uuid=uuid).first()
+        if obj == None:
+            return make_response(jsonify({'message': 'UUID not found'}),404)
+        if request.args.get('redirect',str(DOWNLOAD_REDIRECT)).lower() in ['1','true']:
+            return redirect(obj.presigned_url())
         return obj.download()
 
 
@@ -555,12 +988,14 @@ class ContainerUpRoute(Resource):
 class ContainerDownRoute(Resource):
     '''Shows a container all the way down as a tree'''
     @ns_container.doc('container_down')
+    @cached('containers')
     def get(self,uuid):
         return jsonify(child_tree(Container.query.filter_by(uuid=uuid).first()))
 
 @ns_container.route('/tree_view/')
 class ContainerTree(Resource):
     @ns_container.doc('container_tree')
+    @cached('containers')
     def get(self):
         headers = {'Content-Type': 'text/html'}
         return make_response(tree_str(Container.query.filter_by(container_type='Lab').first()))
@@ -568,6 +1003,7 @@ class ContainerTree(Resource):
 @ns_container.route('/tree_view_full/')
 class ContainerTreePlate(Resource):
     @ns_container.doc('container_tree_full')
+    @cached('containers','plates','modules')
     def get(self):
         headers = {'Content-Type': 'text/html'}
         return make_response(tree_str(Container.query.filter_by(container_type='Lab').first(),full='full'))
@@ -655,11 +1091,13 @@ def plate_packet(uuid):
 
 @ns_plate.route('/recurse/<uuid>')
 class PlateSamples(Resource):
+    @cached('plates','wells','samples','parts')
     def get(self,uuid):
         return jsonify(plate_recurse(uuid))
 
 @ns_plate.route('/packet/<uuid>')
 class PlatePacket(Resource):
+    @cached('plates','wells','samples','parts','collections','authors','tags')
     def get(self,uuid):
         return jsonify(plate_packet(uuid))
 ###
@@ -732,7 +1170,7 @@ class ShippoCRUD():
             def post(self):
                 if validate_json == True:
                     try:
-                        validate(instance=request.get_json(),schema=cls.validator)
+                        cls.compiled_validator.validate(request.get_json())
                     except Exception as e:
                         return make_response(jsonify({'message': 'Schema validation failed: {}'.format(e)}),400)
                 if 'uuid' in request.get_json():
@@ -0,0 +1,56 @@
+"""Response encoding benchmark for a 10k-part /parts/ listing.
+
+Serializes synthetic Part.toJSON() dictionaries with Flask's jsonify and with
+app.encoder.jsonify. No database is touched, but importing the app needs the
+usual environment variables (placeholder values are fine).
+
+    python -m benchmarks.bench_encoder --parts 10000 --repeat 5
+"""
+import argparse
+import datetime
+import random
+import timeit
+import uuid
+
+from flask import jsonify as flask_jsonify
+
+from app import app
+from app import encoder
+
+def synthetic_parts(n,seed=0):
+    rng = random.Random(seed)
+    now = datetime.datetime(2020,1,1,tzinfo=datetime.timezone.utc)
+    collection = uuid.UUID(int=rng.getrandbits(128))
+    author = uuid.UUID(int=rng.getrandbits(128))
+    def seq(length):
+        return ''.join(rng.choice('ATGC') for _ in range(length))
+    parts = []
+    for i in range(n):
+        parts.append({'uuid': uuid.UUID(int=rng.getrandbits(128)), 'time_created': now + datetime.timedelta(seconds=i), 'time_updated': now + datetime.timedelta(seconds=i, minutes=5),
+            'status': 'syn_checked', 'tags': ['cds','ecoli'], 'name': 'part_{}'.format(i), 'description': 'Synthetic part {}'.format(i), 'gene_id': 'BBF10K_{:06d}'.format(i),
+            'part_type': 'cds', 'original_sequence': seq(300), 'optimized_sequence': seq(300), 'synthesized_sequence': seq(300), 'full_sequence': seq(360),
+            'genbank': {'features': [{'type': 'CDS', 'start': 0, 'end': 300}]}, 'vector': None, 'primer_for': None, 'primer_rev': None, 'barcode': None, 'vbd': None,
+            'author_uuid': author, 'collection_id': collection, 'translation': None, 'ip_check': 'Not_Checked', 'ip_check_date': None, 'ip_check_ref': None})
+    return parts
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--parts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    parts = synthetic_parts(args.parts)
+    candidates = [('flask jsonify', flask_jsonify)]
+    for name,backend in encoder.backends.items():
+        candidates.append(('encoder ({})'.format(name), lambda data, backend=backend: encoder.Response(backend(data) + b'\n', mimetype='application/json')))
+
+    with app.test_request_context():
+        baseline = None
+        print('{:<20} {:>10} {:>10} {:>8}'.format('encoder', 'best (ms)', 'bytes', 'speedup'))
+        for name,func in candidates:
+            best = min(timeit.repeat(lambda: func(parts).get_data(), number=1, repeat=args.repeat))
+            baseline = best if baseline == None else baseline
+            print('{:<20} {:>10.1f} {:>10} {:>7.1f}x'.format(name, best*1000, len(func(parts).get_data()), baseline/best))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Inventory loading benchmark for Build.generate_PlateList.
+
+Builds a synthetic inventory frame shaped like the transfer query result and
+turns it into a PlateList with the old iterrows loop and with
+plate_list_from_frame. The SQL itself is not timed and no database is needed,
+but importing the app needs the usual environment variables (placeholder
+values are fine).
+
+    python -m benchmarks.bench_generate_platelist --plates 5000 --wells 96
+"""
+import argparse
+import time
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from app.optimal_selection import Part, Plate, PlateList, plate_list_from_frame
+
+def synthetic_inventory(plates,wells,parts,containers,seed=0):
+    rng = np.random.default_rng(seed)
+    plate_uuids = np.array([str(uuid.UUID(int=int(x))) for x in rng.integers(0,2**63,plates)])
+    part_uuids = np.array([str(uuid.UUID(int=int(x))) for x in rng.integers(0,2**63,parts)])
+    container_uuids = np.array([str(uuid.UUID(int=int(x))) for x in rng.integers(0,2**63,containers)])
+    addresses = np.array(['{}{}'.format(row,col) for row in 'ABCDEFGHIJKLMNOP' for col in range(1,25)])
+    plate_of_row = np.repeat(np.arange(plates),wells)
+    thaw = (rng.integers(0,5,plates) + 1) * wells
+    return pd.DataFrame({'part_uuid': part_uuids[rng.integers(0,parts,plates*wells)],
+        'plate_uuid': plate_uuids[plate_of_row],
+        'address': addresses[np.tile(np.arange(wells),plates) % len(addresses)],
+        'volume': rng.uniform(10,100,plates*wells),
+        'thaw_weight': thaw[plate_of_row],
+        'container_uuid': container_uuids[rng.integers(0,containers,plates)][plate_of_row]})
+
+def legacy_plate_list(df): # The per-row loop generate_PlateList used before
+    plate_dict = {}
+    thaw_dict = {}
+    container_dict = {}
+    for index, row in df.iterrows():
+        plate_dict.setdefault(str(row.iloc[1]),[]).append({"part_uuid":str(row.iloc[0]), "address":row.iloc[2], "volume":row.iloc[3], "quantity":row.iloc[4]})
+        thaw_dict.setdefault(str(row.iloc[1]),row.iloc[4])
+        container_dict.setdefault(str(row.iloc[1]),str(row.iloc[5]))
+    plates = []
+    for k,v in plate_dict.items():
+        plates.append(Plate(k,[Part(x['part_uuid'],x['address'],x['volume'],x['quantity'],k) for x in v],thaw_dict[k],container_dict[k]))
+    return PlateList(plates)
+
+def timed(func,df):
+    start = time.perf_counter()
+    result = func(df)
+    return time.perf_counter() - start, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--plates', type=int, default=5000)
+    parser.add_argument('--wells', type=int, default=96)
+    parser.add_argument('--parts', type=int, default=50000)
+    parser.add_argument('--containers', type=int, default=40)
+    parser.add_argument('--skip-legacy', action='store_true', help='the iterrows loop takes minutes at full size')
+    args = parser.parse_args()
+
+    df = synthetic_inventory(args.plates,args.wells,args.parts,args.containers)
+    print('{} rows, {} plates'.format(len(df),args.plates))
+    columnar, plate_list = timed(plate_list_from_frame,df)
+    print('{:<22} {:>9.2f} s  {} plates'.format('plate_list_from_frame',columnar,len(plate_list.plates)))
+    if not args.skip_legacy:
+        legacy, legacy_list = timed(legacy_plate_list,df)
+        print('{:<22} {:>9.2f} s  {} plates'.format('iterrows (before)',legacy,len(legacy_list.plates)))
+        print('speedup {:.1f}x'.format(legacy/columnar))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""Plate selection benchmark for Build.export_solution.
+
+Generates seeded synthetic inventories (plates x wells, with each part stocked
+on several plates spread over containers) and runs the selection pipeline on an
+injected PlateList, so no database is needed. As with inventory_sql, the
+PlateList only holds the wells of the parts the build asks for. Importing the app still needs the
+usual environment variables (placeholder values are fine).
+
+For every scenario and seed it reports wall time, peak traced memory and the
+quality of the answer: plates, containers and thaw weight of the chosen cover,
+how many plates the greedy cover needed, whether the search finished inside its
+time budget, and how many transfers ran short of volume.
+
+    python -m benchmarks.bench_selection --scenario large --seeds 3
+    python -m benchmarks.bench_selection --plates 800 --wells 96 --redundancy 3 --build-parts 150
+"""
+import argparse
+import random
+import time
+import tracemalloc
+import uuid
+
+from app.optimal_selection import Plate, PlateList, PlateSolver, Build
+
+scenarios = {
+    'small': {'plates': 50, 'wells': 96, 'redundancy': 2, 'containers': 5, 'build_parts': 20, 'group_size': 4},
+    'medium': {'plates': 400, 'wells': 96, 'redundancy': 3, 'containers': 20, 'build_parts': 100, 'group_size': 5},
+    'large': {'plates': 2000, 'wells': 384, 'redundancy': 4, 'containers': 60, 'build_parts': 400, 'group_size': 8},
+}
+
+def synthetic_inventory(plates,wells,redundancy,containers,seed=0): # part_uuids, and per plate (uuid, thaw weight, container, wells)
+    rng = random.Random(seed)
+    def new_uuid():
+        return str(uuid.UUID(int=rng.getrandbits(128)))
+    container_uuids = [new_uuid() for _ in range(containers)]
+    addresses = ['{}{}'.format(row,col) for row in 'ABCDEFGHIJKLMNOP' for col in range(1,25)]
+    # Every part sits in `redundancy` wells, scattered over the plates
+    slots = [(plate,well) for plate in range(plates) for well in range(wells)]
+    rng.shuffle(slots)
+    part_uuids = [new_uuid() for _ in range(len(slots) // redundancy)]
+    contents = [[] for _ in range(plates)]
+    for index,(plate,well) in enumerate(slots[:len(part_uuids)*redundancy]):
+        contents[plate].append((part_uuids[index % len(part_uuids)],addresses[well % len(addresses)],rng.uniform(10,100)))
+    return part_uuids, [(new_uuid(),(rng.randint(0,4) + 1) * wells,rng.choice(container_uuids),wells_in_plate) for wells_in_plate in contents]
+
+def synthetic_plate_list(inventory,parts): # What generate_PlateList would load for these parts
+    parts = set(parts)
+    plate_list = []
+    for plate_uuid,thaw_weight,container_uuid,wells_in_plate in inventory:
+        wells_in_plate = [x for x in wells_in_plate if x[0] in parts]
+        if wells_in_plate:
+            columns = ([x[0] for x in wells_in_plate],[x[1] for x in wells_in_plate],[x[2] for x in wells_in_plate],[thaw_weight]*len(wells_in_plate))
+            plate_list.append(Plate(plate_uuid,None,thaw_weight,container_uuid,columns=columns))
+    return PlateList(plate_list)
+
+def synthetic_build(part_uuids,build_parts,group_size,seed=0):
+    rng = random.Random(seed)
+    parts = rng.sample(part_uuids,min(build_parts,len(part_uuids)))
+    return [parts[i:i+group_size] for i in range(0,len(parts),group_size)]
+
+def run(config,seed,sort_methods,time_budget):
+    part_uuids, inventory = synthetic_inventory(config['plates'],config['wells'],config['redundancy'],config['containers'],seed=seed)
+    build = Build([])
+    build.transfer_groups_as_part(synthetic_build(part_uuids,config['build_parts'],config['group_size'],seed=seed),10)
+    plate_list = synthetic_plate_list(inventory,build.export_flat_part_list())
+    build.plate_list = plate_list
+
+    solver = PlateSolver(plate_list,build.export_flat_part_list(),sort_methods=sort_methods,time_budget=time_budget)
+    greedy = solver.greedy()
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build.export_solution(sort_methods,time_budget=time_budget)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    chosen = plate_list.sublist([plate for plate in plate_list.plates if plate.uuid in result['plates']])
+    solver.solve() # Same search again, only to learn whether it finished inside the budget
+    return {'candidates': len(plate_list.plates), 'seconds': elapsed, 'peak_mb': peak / 2**20, 'plates': len(chosen.plates), 'greedy': len(greedy),
+            'containers': len(chosen.containers()), 'thaw': chosen.thaw_weight(), 'optimal': solver.optimal,
+            'shortfalls': len(result['shortfalls'])}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--scenario', choices=sorted(scenarios), help='preset sizes; flags below override it')
+    for name in ['plates','wells','redundancy','containers','build_parts','group_size']:
+        parser.add_argument('--'+name.replace('_','-'), dest=name, type=int)
+    parser.add_argument('--seeds', type=int, default=3, help='seeds 0..n-1, so runs are comparable between commits')
+    parser.add_argument('--time-budget', type=float, default=5)
+    parser.add_argument('--sort-method', action='append', help='repeat for several, default fewest_plates then fewest_retrieval')
+    args = parser.parse_args()
+
+    names = [args.scenario] if args.scenario != None else sorted(scenarios, key=lambda name: scenarios[name]['plates'])
+    sort_methods = args.sort_method or ['fewest_plates','fewest_retrieval']
+    print('{:<8} {:>4} {:>10} {:>9} {:>9} {:>6} {:>6} {:>10} {:>8} {:>7} {:>10}'.format('scenario','seed','candidates','seconds','peak MB','plates','greedy','containers','thaw','optimal','shortfalls'))
+    for name in names:
+        config = dict(scenarios[name])
+        config.update({key: value for key,value in vars(args).items() if key in config and value != None})
+        for seed in range(args.seeds):
+            r = run(config,seed,sort_methods,args.time_budget)
+            print('{:<8} {:>4} {:>10} {:>9.3f} {:>9.1f} {:>6} {:>6} {:>10} {:>8} {:>7} {:>10}'.format(name,seed,r['candidates'],r['seconds'],r['peak_mb'],r['plates'],r['greedy'],r['containers'],r['thaw'],str(r['optimal']),r['shortfalls']))
+
+if __name__ == '__main__':
+    main()